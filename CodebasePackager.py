@@ -0,0 +1,123 @@
+import io
+import json
+import os
+import zipfile
+
+from CodebaseStreamParser import CodebaseStreamParser
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+
+def load_codebase_files(codebase_json):
+    # Liste der Dateien aus dem JSON auslesen
+    data = json.loads(codebase_json)
+    files = []
+    for file_info in data.get("files", []):
+        content = file_info.get("content")
+        if isinstance(content, list):
+            content = "\n".join(content)
+        files.append({"filename": file_info.get("filename"), "content": content})
+    return files
+
+
+def read_archive_files(zip_path, skip_dirs=("inputs/", "inputs\\")):
+    # Generated files from a packaged codebase, without the archived input files
+    files = []
+    with zipfile.ZipFile(zip_path) as zipf:
+        for name in zipf.namelist():
+            if name.endswith("/") or name.startswith(skip_dirs):
+                continue
+            files.append({"filename": name, "content": zipf.read(name).decode("utf-8", errors="replace")})
+    return files
+
+
+def merge_codebase_files(existing_files, changed_files):
+    # Changed files replace their previous version, new files are appended
+    merged = {file_info["filename"]: file_info for file_info in existing_files}
+    for file_info in changed_files:
+        merged[file_info["filename"]] = file_info
+    return list(merged.values())
+
+
+class CodebaseZipWriter:
+    # Builds the archive in memory in a single pass; files can be added one by one
+    # (e.g. while a response is still streaming) and the result is written to disk once
+    def __init__(self, zip_path=None, inputs_dir=None, extra_files=(), compression=None, compresslevel=None):
+        self.zip_path = zip_path
+        self.inputs_dir = inputs_dir
+        self.extra_files = list(extra_files)
+        compression = (compression or os.getenv("CODEBASE_ZIP_COMPRESSION", "stored")).lower()
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unknown zip compression: {compression}")
+        if compresslevel is None and os.getenv("CODEBASE_ZIP_LEVEL"):
+            compresslevel = int(os.getenv("CODEBASE_ZIP_LEVEL"))
+        self.compresslevel = compresslevel
+        self.buffer = io.BytesIO()
+        self.zipf = zipfile.ZipFile(self.buffer, 'w', compression=COMPRESSION_METHODS[compression],
+                                    compresslevel=compresslevel)
+        self.filenames = []
+
+    def _write(self, filename, content):
+        # Fixed timestamp: the same files always give a byte-identical archive, so GitHubManager
+        # recognizes an unchanged codebase by its sha and skips the upload
+        info = zipfile.ZipInfo(filename, date_time=(1980, 1, 1, 0, 0, 0))
+        info.compress_type = self.zipf.compression
+        info.external_attr = 0o600 << 16
+        self.zipf.writestr(info, content, compresslevel=self.compresslevel)
+
+    def add(self, filename, content):
+        self._write(filename, content)
+        self.filenames.append(filename)
+
+    def close(self):
+        # Füge extra input-Dateien hinzu, falls vorhanden (im ZIP unter dem Ordner "inputs")
+        if self.inputs_dir:
+            for extra_file in self.extra_files:
+                file_path = os.path.join(self.inputs_dir, extra_file)
+                if os.path.exists(file_path):
+                    with open(file_path, 'r', encoding='utf-8') as ef:
+                        self._write(os.path.join("inputs", extra_file), ef.read())
+        self.zipf.close()
+
+        archive = self.buffer.getbuffer()
+        if self.zip_path:
+            with open(self.zip_path, 'wb') as f:
+                f.write(archive)
+        # ZIP-Datei als memoryview zurückgeben, ohne sie erneut von der Platte zu lesen
+        return archive
+
+
+def package_codebase(files, zip_path=None, inputs_dir=None, extra_files=(), compression=None, compresslevel=None):
+    writer = CodebaseZipWriter(zip_path, inputs_dir, extra_files, compression, compresslevel)
+    for file_info in files:
+        writer.add(file_info["filename"], file_info["content"])
+    return writer.close()
+
+
+def stream_codebase(chunks, txt_path, zip_path=None, inputs_dir=None, extra_files=(), compression=None, compresslevel=None,
+                    recover=None):
+    # recover(files, raw_text) is called for a response that ended early and returns the missing files
+    parser = CodebaseStreamParser()
+    raw_parts = []
+    writer = CodebaseZipWriter(zip_path, inputs_dir, extra_files, compression, compresslevel)
+
+    with open(txt_path, 'w', encoding='utf-8') as txt:
+        for chunk in chunks:
+            # Rohantwort mitschreiben, damit sie auch bei einem Abbruch erhalten bleibt
+            txt.write(chunk)
+            raw_parts.append(chunk)
+            for file_info in parser.feed(chunk):
+                writer.add(file_info["filename"], file_info["content"])
+                print(f"Generated file: {file_info['filename']}")
+
+    if not parser.complete:
+        print(f"Warning: streamed codebase ended early, {len(parser.files)} complete files were saved.")
+        if recover:
+            for file_info in recover(list(parser.files), "".join(raw_parts)):
+                writer.add(file_info["filename"], file_info["content"])
+    return writer.close()
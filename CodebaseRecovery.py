@@ -0,0 +1,81 @@
+import json
+import os
+
+from CodebaseStreamParser import CodebaseStreamParser, entry_filename
+from StructuredOutput import CODEBASE_SCHEMA
+
+
+def extract_codebase_files(text):
+    # Tolerant version of load_codebase_files for raw model output. Returns (files, complete, missing):
+    # markdown fences, prose and trailing comments around the JSON are ignored, and a truncated
+    # response still yields every file entry that was fully written before the cut. missing names the
+    # files that have to be generated again: the one that was cut off and entries that were malformed.
+    start = text.find('{')
+    if start != -1:
+        try:
+            # Fast path: one C-level decode, raw_decode stops at the end of the root object
+            data, _ = json.JSONDecoder().raw_decode(text, start)
+            if isinstance(data, dict) and isinstance(data.get("files"), list):
+                files = _normalize(data["files"])
+                dropped = [file_info for file_info in data["files"]
+                           if not isinstance(file_info, dict) or not file_info.get("filename")]
+                return files, not dropped, []
+        except ValueError:
+            pass
+
+    # Slow path, still a single scan: the stream parser salvages every complete entry
+    parser = CodebaseStreamParser()
+    parser.feed(text)
+    missing = [name for name in parser.dropped if name]
+    if parser.item_parts:
+        cut_off = entry_filename("".join(parser.item_parts))
+        if cut_off:
+            missing.append(cut_off)
+    return parser.files, parser.complete, missing
+
+
+def _normalize(entries):
+    files = []
+    for file_info in entries:
+        if not isinstance(file_info, dict) or not file_info.get("filename"):
+            continue
+        content = file_info.get("content", "")
+        if isinstance(content, list):
+            content = "\n".join(content)
+        files.append({"filename": file_info["filename"], "content": content})
+    return files
+
+
+def recover_codebase(llm, prompt, response, stage, max_rounds=None):
+    # Returns the files of a codebase response; if the response was cut off, only the missing
+    # files are requested again instead of regenerating the whole codebase
+    files, complete, missing = extract_codebase_files(response)
+    if complete:
+        return files
+
+    max_rounds = int(os.getenv("CODEGEN_RECOVERY_ROUNDS", "2")) if max_rounds is None else max_rounds
+    for round_number in range(1, max_rounds + 1):
+        done = ", ".join(file_info["filename"] for file_info in files) or "none"
+        print(f"Codebase response is incomplete ({len(files)} files salvaged), requesting the missing files "
+              f"(round {round_number}).")
+        continuation = (
+            f"{prompt}\n\n"
+            f"Your previous response was cut off or contained malformed file entries. These files are already "
+            f"complete and must not be repeated: {done}.\n"
+        )
+        known = {file_info["filename"] for file_info in files}
+        missing = [name for name in dict.fromkeys(missing) if name not in known]
+        if missing:
+            continuation += (f"These files were cut off or malformed and have to be generated again in full: "
+                             f"{', '.join(missing)}.\n")
+        continuation += "Respond with the remaining files only, in the same JSON format."
+
+        response = llm.get_chat_response(continuation, stage=f"{stage}.recovery", schema=CODEBASE_SCHEMA)
+        new_files, complete, missing = extract_codebase_files(response)
+        files.extend(file_info for file_info in new_files if file_info["filename"] not in known)
+        if complete or not new_files:
+            break
+
+    if not complete:
+        print(f"Warning: codebase is still incomplete after recovery, continuing with {len(files)} files.")
+    return files
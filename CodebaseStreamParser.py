@@ -0,0 +1,143 @@
+import json
+import re
+
+# Characters that change the parser state; everything else is copied through untouched
+TOKEN_PATTERN = re.compile(r'[{}\[\]"\\]')
+
+FILENAME_PATTERN = re.compile(r'"filename"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class CodebaseStreamParser:
+    # Incremental parser for {"files": [{"filename": ..., "content": ...}, ...]} responses.
+    # feed() returns every file entry that was completed by the new chunk, so files can be
+    # written while the model is still generating the rest. Each character is scanned once.
+    def __init__(self):
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.closed = False
+        self.item_parts = None
+        # Last key of the root object, read across chunks; only entries of its "files" array count
+        self.key_parts = None
+        self.last_key = None
+        self.in_files = False
+        self.files = []
+        # Entries that were not valid file objects: their filename if one can be found, else None
+        self.dropped = []
+
+    @property
+    def complete(self):
+        # The root object was closed and no entry was lost on the way
+        return self.closed and not self.dropped
+
+    def feed(self, chunk):
+        entries = []
+        if self.closed or not chunk:
+            return entries
+
+        item_start = 0 if self.item_parts is not None else None
+        key_start = 0 if self.key_parts is not None else None
+        skip_until = 0
+        if self.escape:
+            # The previous chunk ended with a backslash inside a string
+            skip_until = 1
+            self.escape = False
+
+        for match in TOKEN_PATTERN.finditer(chunk):
+            i = match.start()
+            if i < skip_until:
+                continue
+            char = match.group()
+
+            if self.in_string:
+                if char == '\\':
+                    skip_until = i + 2
+                    if skip_until > len(chunk):
+                        self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.key_parts is not None:
+                        self.key_parts.append(chunk[key_start:i])
+                        self.last_key = self._decode_key("".join(self.key_parts))
+                        self.key_parts = None
+                        key_start = None
+                continue
+
+            if not self.started:
+                # Skip markdown fences or prose until the root object begins
+                if char != '{':
+                    continue
+                self.started = True
+
+            if char == '"':
+                self.in_string = True
+                if len(self.stack) == 1:
+                    self.key_parts = []
+                    key_start = i + 1
+            elif char in '{[':
+                self.stack.append(char)
+                if len(self.stack) == 2:
+                    self.in_files = char == '[' and self.last_key == "files"
+                if self._at_file_entry() and char == '{':
+                    self.item_parts = []
+                    item_start = i
+            elif char in '}]':
+                if not self.stack:
+                    continue
+                self.stack.pop()
+                if char == '}' and self.item_parts is not None and len(self.stack) == 2:
+                    self.item_parts.append(chunk[item_start:i + 1])
+                    raw_entry = "".join(self.item_parts)
+                    entry = self._decode_entry(raw_entry)
+                    self.item_parts = None
+                    item_start = None
+                    if entry:
+                        self.files.append(entry)
+                        entries.append(entry)
+                    else:
+                        self.dropped.append(entry_filename(raw_entry))
+                elif not self.stack:
+                    self.closed = True
+                    break
+
+        if self.item_parts is not None and item_start is not None:
+            self.item_parts.append(chunk[item_start:])
+        if self.key_parts is not None and key_start is not None:
+            self.key_parts.append(chunk[key_start:])
+        return entries
+
+    def _at_file_entry(self):
+        # Root object -> "files" array -> file object
+        return len(self.stack) == 3 and self.stack[0] == '{' and self.stack[1] == '[' and self.in_files
+
+    @staticmethod
+    def _decode_key(text):
+        try:
+            return json.loads(f'"{text}"')
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _decode_entry(text):
+        try:
+            entry = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or not entry.get("filename"):
+            return None
+        content = entry.get("content", "")
+        if isinstance(content, list):
+            content = "\n".join(content)
+        return {"filename": entry["filename"], "content": content}
+
+
+def entry_filename(raw_entry):
+    # Filename of a raw (possibly broken or cut off) file entry, None if it has none
+    match = FILENAME_PATTERN.search(raw_entry)
+    if not match:
+        return None
+    try:
+        return json.loads(f'"{match.group(1)}"')
+    except ValueError:
+        return None
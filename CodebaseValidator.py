@@ -0,0 +1,438 @@
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from CodebasePackager import read_archive_files
+from CodebaseRecovery import extract_codebase_files
+
+# Exceptions raised while importing a module that point at a bug in the generated code;
+# anything else (missing display for a GUI, timeouts, ...) is only reported as a warning
+IMPORT_ERROR_TYPES = {"ImportError", "ModuleNotFoundError", "NameError", "SyntaxError", "IndentationError",
+                      "TabError", "AttributeError", "TypeError"}
+
+SMOKE_IMPORT_SCRIPT = (
+    "import importlib, json, sys, traceback\n"
+    "try:\n"
+    "    importlib.import_module(sys.argv[1])\n"
+    "except BaseException as e:\n"
+    "    frames = traceback.extract_tb(e.__traceback__)\n"
+    "    line = getattr(e, 'lineno', None) or (frames[-1].lineno if frames else None)\n"
+    "    print(json.dumps({'type': type(e).__name__, 'message': str(e), 'line': line, 'name': getattr(e, 'name', None),\n"
+    "                      'file': getattr(e, 'filename', None) or (frames[-1].filename if frames else None)}))\n"
+    "    sys.exit(1)\n"
+)
+
+# Environment of the validation subprocesses; PATH, plus what Python needs to start on Windows
+SANDBOX_ENV = ["PATH", "SYSTEMROOT", "TEMP", "TMP"]
+
+# sitecustomize.py of the validation subprocesses, imported before any generated code runs: CPU time,
+# memory and file size limits (inherited by child processes, POSIX only) and no network from Python
+SANDBOX_GUARD_SCRIPT = (
+    "import os, socket, sys\n"
+    "try:\n"
+    "    import resource\n"
+    "except ImportError:\n"
+    "    resource = None\n"
+    "if resource is not None:\n"
+    "    for name, variable in (('RLIMIT_CPU', 'SANDBOX_CPU_SECONDS'), ('RLIMIT_AS', 'SANDBOX_MEMORY_BYTES'),\n"
+    "                           ('RLIMIT_FSIZE', 'SANDBOX_FILE_SIZE_BYTES')):\n"
+    "        if variable in os.environ and hasattr(resource, name):\n"
+    "            limit = int(os.environ[variable])\n"
+    "            _, hard = resource.getrlimit(getattr(resource, name))\n"
+    "            limit = limit if hard == resource.RLIM_INFINITY else min(limit, hard)\n"
+    "            resource.setrlimit(getattr(resource, name), (limit, limit))\n"
+    "LOCAL_FAMILIES = {getattr(socket, 'AF_UNIX', None)}\n"
+    "def block_network(event, args):\n"
+    "    lookup = event in ('socket.getaddrinfo', 'socket.gethostbyname', 'socket.gethostbyaddr')\n"
+    "    send = event in ('socket.connect', 'socket.sendto', 'socket.sendmsg')\n"
+    "    if lookup or (send and args[0].family not in LOCAL_FAMILIES):\n"
+    "        raise PermissionError('network access is disabled during validation')\n"
+    "sys.addaudithook(block_network)\n"
+)
+
+
+def module_name(filename):
+    # "app/models/note.py" -> "app.models.note", "app/__init__.py" -> "app"
+    parts = filename.replace("\\", "/")[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    return ".".join(part for part in parts if part)
+
+
+def is_test_file(filename):
+    name = os.path.basename(filename)
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def check_syntax(file_info):
+    try:
+        return ast.parse(file_info["content"], file_info["filename"]), None
+    except (SyntaxError, ValueError) as e:
+        return None, {
+            "filename": file_info["filename"], "line": getattr(e, "lineno", None),
+            "type": type(e).__name__, "message": getattr(e, "msg", str(e)),
+        }
+
+
+def defined_names(tree):
+    # Top level names a "from module import name" can pick up; None if the module is too dynamic to tell
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            if node.name == "__getattr__":
+                return None
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for name_node in ast.walk(target):
+                    if isinstance(name_node, ast.Name):
+                        names.add(name_node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+            # Conditional definitions (try/except ImportError, platform checks): collect them all
+            wrapper = ast.Module(body=[child for child in ast.iter_child_nodes(node) if isinstance(child, ast.stmt)],
+                                 type_ignores=[])
+            for handler in getattr(node, "handlers", []):
+                wrapper.body.extend(handler.body)
+            nested = defined_names(wrapper)
+            if nested is None:
+                return None
+            names.update(nested)
+    return names
+
+
+def check_imports(filename, tree, modules, packages):
+    # Static resolution of intra-project imports, including the filename case that only
+    # breaks on case-sensitive file systems
+    errors = []
+    warnings = []
+    lowered = {name.lower(): name for name in modules}
+    current_package = module_name(filename).rpartition(".")[0] if not filename.endswith("__init__.py") \
+        else module_name(filename)
+
+    def resolve(name, node):
+        if name in modules:
+            return name
+        if name in packages:
+            return None
+        top = name.split(".")[0]
+        if name.lower() in lowered:
+            errors.append({
+                "filename": filename, "line": node.lineno, "type": "ImportCaseError",
+                "message": f"'{name}' does not match the file name case of '{lowered[name.lower()]}'",
+            })
+            return None
+        if top in modules or top in packages:
+            errors.append({
+                "filename": filename, "line": node.lineno, "type": "ModuleNotFoundError",
+                "message": f"No module named '{name}' in the generated codebase",
+            })
+            return None
+        if top.lower() in lowered or top.lower() in {package.lower() for package in packages}:
+            errors.append({
+                "filename": filename, "line": node.lineno, "type": "ImportCaseError",
+                "message": f"'{top}' does not match the case of the project file or package name",
+            })
+            return None
+        if top not in sys.stdlib_module_names and importlib.util.find_spec(top) is None:
+            warnings.append({
+                "filename": filename, "line": node.lineno, "type": "MissingDependency",
+                "message": f"'{top}' is neither part of the codebase nor installed",
+            })
+        return None
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                resolve(alias.name, node)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = current_package.split(".") if current_package else []
+                base = base[:len(base) - (node.level - 1)] if node.level > 1 else base
+                name = ".".join(base + ([node.module] if node.module else []))
+            else:
+                name = node.module
+            if not name:
+                continue
+            target = resolve(name, node)
+            if target is None or modules[target] is None:
+                continue
+            available = modules[target]
+            for alias in node.names:
+                if alias.name == "*" or alias.name in available or f"{target}.{alias.name}" in modules:
+                    continue
+                errors.append({
+                    "filename": filename, "line": node.lineno, "type": "ImportError",
+                    "message": f"cannot import name '{alias.name}' from '{target}'",
+                })
+    return errors, warnings
+
+
+def affected_files(files, changed):
+    # Changed files plus every file that imports one of them, directly or transitively
+    modules = {module_name(file_info["filename"]): file_info["filename"]
+               for file_info in files if file_info["filename"].endswith(".py")}
+    importers = {}
+    for file_info in files:
+        if not file_info["filename"].endswith(".py"):
+            continue
+        tree, _ = check_syntax(file_info)
+        if tree is None:
+            continue
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            for name in names:
+                if name in modules:
+                    importers.setdefault(modules[name], set()).add(file_info["filename"])
+
+    affected = set(changed)
+    pending = list(changed)
+    while pending:
+        for importer in importers.get(pending.pop(), ()):
+            if importer not in affected:
+                affected.add(importer)
+                pending.append(importer)
+    return affected
+
+
+def merge_reports(previous, report):
+    # Results of files that were not checked again are carried over from the previous report
+    checked = set(report["checked"])
+    # Entries of deleted files are dropped
+    current = set(report["all_files"])
+
+    def keep(entry):
+        return entry["filename"] not in checked and entry["filename"] in current
+
+    merged = dict(report)
+    merged["errors"] = [entry for entry in previous["errors"] if keep(entry)] + report["errors"]
+    merged["warnings"] = [entry for entry in previous["warnings"] if keep(entry)] + report["warnings"]
+    merged["tests"] = [entry for entry in previous["tests"] if keep(entry)] + report["tests"]
+    merged["ok"] = not merged["errors"]
+    return merged
+
+
+def write_sandbox(files, directory):
+    for file_info in files:
+        relative = os.path.normpath(file_info["filename"].replace("\\", "/"))
+        if os.path.isabs(relative) or relative.startswith(".."):
+            continue
+        path = os.path.join(directory, relative)
+        os.makedirs(os.path.dirname(path) or directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(file_info["content"] or "")
+
+
+def write_guard(directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "sitecustomize.py"), "w", encoding="utf-8") as f:
+        f.write(SANDBOX_GUARD_SCRIPT)
+
+
+def run_isolated(args, directory, timeout, guard_dir=None):
+    # Separate process in a throw-away copy of the codebase, without stdin and with a hard timeout.
+    # Only allow-listed variables are passed on: the generated code must not see the API keys from .env
+    env = {name: os.environ[name] for name in SANDBOX_ENV if name in os.environ}
+    env.update(PYTHONPATH=directory, PYTHONDONTWRITEBYTECODE="1", MPLBACKEND="Agg")
+    if guard_dir:
+        # The guard comes first, so a sitecustomize.py of the generated code cannot replace it
+        env.update(PYTHONPATH=os.pathsep.join([guard_dir, directory]),
+                   SANDBOX_CPU_SECONDS=str(int(timeout) + 1),
+                   SANDBOX_MEMORY_BYTES=str(int(os.getenv("VALIDATION_MEMORY_MB", "2048")) * 1024 * 1024),
+                   SANDBOX_FILE_SIZE_BYTES=str(int(os.getenv("VALIDATION_FILE_SIZE_MB", "16")) * 1024 * 1024))
+    start = time.time()
+    try:
+        result = subprocess.run(args, cwd=directory, env=env, stdin=subprocess.DEVNULL, capture_output=True,
+                                text=True, timeout=timeout)
+        return result.returncode, result.stdout, result.stderr, time.time() - start
+    except subprocess.TimeoutExpired as e:
+        return None, e.stdout or "", e.stderr or "", time.time() - start
+
+
+def smoke_import(module, directory, timeout, guard_dir=None):
+    returncode, stdout, stderr, duration = run_isolated(
+        [sys.executable, "-c", SMOKE_IMPORT_SCRIPT, module], directory, timeout, guard_dir)
+    if returncode == 0:
+        return None
+    if returncode is None:
+        return {"type": "Timeout", "message": f"importing took longer than {timeout}s"}
+    lines = stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"type": "ImportFailed", "message": stderr.strip()[-500:]}
+
+
+def run_test_file(filename, directory, timeout, guard_dir=None):
+    if importlib.util.find_spec("pytest") is not None:
+        args = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", filename]
+    else:
+        args = [sys.executable, "-m", "unittest", module_name(filename)]
+    returncode, stdout, stderr, duration = run_isolated(args, directory, timeout, guard_dir)
+    status = "passed" if returncode == 0 else "timeout" if returncode is None else "failed"
+    output = (stdout + stderr).strip()
+    return {"filename": filename, "status": status, "duration": round(duration, 3),
+            "output": output[-2000:] if status != "passed" else ""}
+
+
+def validate_codebase(files, max_workers=None, import_timeout=None, test_timeout=None, only=None):
+    # Returns a machine readable report; only= limits the checks to these filenames
+    max_workers = max_workers or int(os.getenv("VALIDATION_WORKERS", str(os.cpu_count() or 4)))
+    import_timeout = import_timeout or float(os.getenv("VALIDATION_IMPORT_TIMEOUT", "10"))
+    test_timeout = test_timeout or float(os.getenv("VALIDATION_TEST_TIMEOUT", "60"))
+    start = time.time()
+    python_files = [file_info for file_info in files if file_info["filename"].endswith(".py")]
+    checked = [file_info for file_info in python_files if only is None or file_info["filename"] in only]
+
+    errors = []
+    warnings = []
+    trees = {}
+    for file_info in python_files:
+        tree, error = check_syntax(file_info)
+        trees[file_info["filename"]] = tree
+        if error and (only is None or file_info["filename"] in only):
+            errors.append(error)
+
+    modules = {module_name(name): (defined_names(tree) if tree else None) for name, tree in trees.items()}
+    packages = {name.rpartition(".")[0] for name in modules if "." in name}
+    for file_info in checked:
+        tree = trees[file_info["filename"]]
+        if tree is not None:
+            import_errors, import_warnings = check_imports(file_info["filename"], tree, modules, packages)
+            errors.extend(import_errors)
+            warnings.extend(import_warnings)
+
+    # Smoke imports and tests need the real interpreter, each in its own process, all in parallel
+    broken = {error["filename"] for error in errors}
+    importable = [file_info["filename"] for file_info in checked
+                  if file_info["filename"] not in broken and not is_test_file(file_info["filename"])]
+    tests = [file_info["filename"] for file_info in checked
+             if is_test_file(file_info["filename"]) and trees[file_info["filename"]] is not None]
+    test_results = []
+    with tempfile.TemporaryDirectory(prefix="codebase_validation_") as sandbox:
+        directory = os.path.join(sandbox, "codebase")
+        guard_dir = os.path.join(sandbox, "guard")
+        write_sandbox(files, directory)
+        write_guard(guard_dir)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            import_futures = [(filename, pool.submit(smoke_import, module_name(filename), directory, import_timeout,
+                                                     guard_dir))
+                              for filename in importable]
+            test_futures = [pool.submit(run_test_file, filename, directory, test_timeout, guard_dir)
+                            for filename in tests]
+            for filename, future in import_futures:
+                failure = future.result()
+                if failure is None:
+                    continue
+                entry = {"filename": filename, "line": failure.get("line"), "type": failure["type"],
+                         "message": f"import failed: {failure['message']}"}
+                # A third party package that is not installed here is already reported by check_imports
+                missing = failure.get("name") or ""
+                third_party = failure["type"] == "ModuleNotFoundError" and missing.split(".")[0] not in \
+                    {name.split(".")[0] for name in modules}
+                (errors if failure["type"] in IMPORT_ERROR_TYPES and not third_party else warnings).append(entry)
+            test_results = [future.result() for future in test_futures]
+
+    for result in test_results:
+        if result["status"] != "passed":
+            errors.append({"filename": result["filename"], "line": None, "type": f"Test{result['status'].title()}",
+                           "message": result["output"]})
+
+    return {
+        "ok": not errors,
+        "files": len(python_files),
+        "checked": [file_info["filename"] for file_info in checked],
+        "all_files": [file_info["filename"] for file_info in python_files],
+        "errors": errors,
+        "warnings": warnings,
+        "tests": test_results,
+        "duration": round(time.time() - start, 3),
+    }
+
+
+def load_files(path):
+    if os.path.isdir(path):
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [name for name in dirs if name not in ("__pycache__", "inputs", ".git")]
+            for name in names:
+                if name.endswith(".py"):
+                    with open(os.path.join(root, name), "r", encoding="utf-8", errors="replace") as f:
+                        files.append({"filename": os.path.relpath(os.path.join(root, name), path).replace(os.sep, "/"),
+                                      "content": f.read()})
+        return files
+    if path.endswith(".zip"):
+        return read_archive_files(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return extract_codebase_files(f.read())[0]
+
+
+def format_feedback(report):
+    # Plain text in the style of a hand written feedback.txt
+    if report["ok"]:
+        return ""
+    lines = ["The generated code does not work yet. Please fix the following errors:"]
+    for error in report["errors"]:
+        location = f"{error['filename']}:{error['line']}" if error.get("line") else error["filename"]
+        message = error["message"].strip().splitlines()
+        if error["type"].startswith("Test"):
+            # Test output: the end of the pytest/unittest log holds the assertion and the summary
+            lines.append(f"- {location} {error['type']}:")
+            lines.extend(f"    {line}" for line in message[-15:])
+        else:
+            lines.append(f"- {location} {error['type']}: {message[0] if message else ''}")
+    return "\n".join(lines) + "\n"
+
+
+def run_validation(codebase_path, report_path, feedback_path=None):
+    # Pipeline stage: never fails the pipeline, the report says whether the code works
+    report = validate_codebase(load_files(codebase_path))
+    report["codebase"] = codebase_path
+    tmp_path = report_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, report_path)
+    if feedback_path:
+        with open(feedback_path, "w", encoding="utf-8") as f:
+            f.write(format_feedback(report))
+    print(f"Validation of {codebase_path}: {len(report['errors'])} errors, {len(report['warnings'])} warnings, "
+          f"{len(report['tests'])} test files ({report['duration']:.1f}s).")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile, import-check and test a generated codebase.")
+    parser.add_argument("codebase", help="generated_codebase*.zip, the JSON .txt or an unpacked codebase directory")
+    parser.add_argument("--report", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--feedback", help="Write the errors as feedback text, e.g. inputs/feedback.txt")
+    args = parser.parse_args()
+
+    if args.report:
+        report = run_validation(args.codebase, args.report, args.feedback)
+    else:
+        report = validate_codebase(load_files(args.codebase))
+        print(json.dumps(report, indent=2))
+        if args.feedback:
+            with open(args.feedback, "w", encoding="utf-8") as f:
+                f.write(format_feedback(report))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import ast
+import json
+import os
+import re
+
+from CodebasePackager import load_codebase_files, read_archive_files
+from RateLimiter import estimate_tokens
+
+# Token budget per prompt section, overridable via FEEDBACK_CONTEXT_BUDGETS="codebase=30000,feedback=1000"
+DEFAULT_BUDGETS = {
+    "architecture": 6000,
+    "specifications": 6000,
+    "feedback": 2000,
+    "codebase": 24000,
+}
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+STOPWORDS = {
+    "the", "and", "for", "not", "are", "but", "with", "this", "that", "there", "now", "way", "able",
+    "should", "would", "could", "when", "what", "which", "from", "into", "have", "has", "can", "all",
+    "also", "only", "does", "doesn", "don", "any", "some", "its", "their", "them", "then", "than",
+    "you", "your", "our", "was", "were", "will", "been", "being", "more", "most", "like", "feature",
+    "features", "through", "after", "before", "still", "yet", "need", "needs", "currently", "seeing",
+}
+
+
+def split_identifier(name):
+    # note_controller -> note, controller; NoteController -> note, controller
+    parts = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name).lower().split("_")
+    return [part for part in parts if part]
+
+
+def keywords_from(text):
+    words = set()
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        for word in [identifier.lower()] + split_identifier(identifier):
+            if len(word) > 2 and word not in STOPWORDS:
+                words.add(word)
+                # Cheap stemming so "tags" matches "tag" and "categories" matches "category"
+                if word.endswith("ies"):
+                    words.add(word[:-3] + "y")
+                elif word.endswith("s"):
+                    words.add(word[:-1])
+    return words
+
+
+def file_symbols(file_info):
+    try:
+        tree = ast.parse(file_info["content"])
+    except (SyntaxError, ValueError):
+        return None
+    symbols = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            symbols.add(node.name)
+    return symbols
+
+
+def signature_summary(file_info):
+    # Compact outline of a file: imports, classes with method signatures, functions
+    filename = file_info["filename"]
+    content = file_info["content"]
+    if not filename.endswith(".py"):
+        lines = content.splitlines()
+        head = "\n".join(lines[:5])
+        more = f"\n... ({len(lines)} lines)" if len(lines) > 5 else ""
+        return f"# {filename}\n{head}{more}"
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError) as error:
+        return f"# {filename}\n# (does not parse: {error})"
+
+    lines = [f"# {filename}"]
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append(ast.get_source_segment(content, node) or "")
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.append(_signature(node))
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(base) for base in node.bases)
+            lines.append(f"class {node.name}({bases}):" if bases else f"class {node.name}:")
+            doc = ast.get_docstring(node)
+            if doc:
+                lines.append(f'    """{doc.splitlines()[0]}"""')
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    lines.append("    " + _signature(item))
+    return "\n".join(lines)
+
+
+def _signature(node):
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    args = ast.unparse(node.args)
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({args}){returns}: ..."
+
+
+def truncate_to_budget(text, budget):
+    if estimate_tokens(text) <= budget:
+        return text
+    # estimate_tokens counts about 4 characters per token
+    return text[:budget * 4] + "\n[... truncated to fit the context budget ...]"
+
+
+def load_existing_codebase(outputs_dir):
+    # Latest feedback iteration first, then the initial codebase. Older runs stored the zip
+    # bytes in the .txt file, so the matching .zip is used when the .txt is not JSON.
+    for name in ['generated_codebase_with_feedback', 'generated_codebase']:
+        txt_path = os.path.join(outputs_dir, f'{name}.txt')
+        zip_path = os.path.join(outputs_dir, f'{name}.zip')
+        if os.path.exists(txt_path):
+            with open(txt_path, 'r', encoding='utf-8') as f:
+                try:
+                    return load_codebase_files(f.read())
+                except ValueError:
+                    pass
+        if os.path.exists(zip_path):
+            return read_archive_files(zip_path)
+    return []
+
+
+class ContextBuilder:
+    def __init__(self, budgets=None, min_relevance=0.3):
+        # Files scoring below min_relevance * best score are only sent as signatures
+        self.min_relevance = min_relevance
+        self.budgets = dict(DEFAULT_BUDGETS)
+        for item in os.getenv("FEEDBACK_CONTEXT_BUDGETS", "").split(","):
+            if "=" in item:
+                section, value = item.split("=", 1)
+                self.budgets[section.strip()] = int(value)
+        self.budgets.update(budgets or {})
+
+    def rank_files(self, files, feedback):
+        keywords = keywords_from(feedback)
+        ranked = []
+        for file_info in files:
+            name_words = set(split_identifier(os.path.splitext(os.path.basename(file_info["filename"]))[0]))
+            symbols = file_symbols(file_info)
+            symbol_words = set()
+            for symbol in symbols or ():
+                symbol_words.update(split_identifier(symbol))
+            content_words = keywords_from(file_info["content"])
+
+            score = 3 * len(keywords & name_words) + 2 * len(keywords & symbol_words) + len(keywords & content_words)
+            if symbols is None and file_info["filename"].endswith(".py"):
+                # Files that don't even parse always need the model's attention
+                score += 10
+            ranked.append((score, file_info))
+        ranked.sort(key=lambda item: -item[0])
+        return ranked
+
+    def build(self, architecture, specifications, feedback, files):
+        sections = {
+            "architecture": truncate_to_budget(architecture, self.budgets["architecture"]),
+            "specifications": truncate_to_budget(specifications, self.budgets["specifications"]),
+            "feedback": truncate_to_budget(feedback, self.budgets["feedback"]),
+        }
+
+        # Relevant files in full first, then the others while the budget lasts (all of them when
+        # the feedback names nothing in the code), the rest as signatures only
+        budget = self.budgets["codebase"]
+        full_files = []
+        outlines = []
+        ranked = self.rank_files(files, feedback)
+        threshold = max(1, ranked[0][0] * self.min_relevance) if ranked else 1
+        others = []
+        for score, file_info in ranked:
+            cost = estimate_tokens(file_info["content"])
+            if score >= threshold and cost <= budget:
+                full_files.append(file_info)
+                budget -= cost
+            else:
+                others.append((cost, file_info))
+        for cost, file_info in others:
+            if cost <= budget:
+                full_files.append(file_info)
+                budget -= cost
+            else:
+                outlines.append(signature_summary(file_info))
+
+        outline_text = truncate_to_budget("\n\n".join(outlines), max(budget, 0))
+        sections["relevant_files"] = json.dumps({"files": full_files}, ensure_ascii=False, indent=2)
+        sections["other_files"] = outline_text
+        sections["full_filenames"] = [file_info["filename"] for file_info in full_files]
+        print(f"Context: {len(full_files)} files in full, {len(outlines)} as signatures "
+              f"({self.budgets['codebase'] - budget} of {self.budgets['codebase']} codebase tokens).")
+        return sections
@@ -0,0 +1,210 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import Counter
+
+from GitHubManager import git_blob_sha
+
+try:
+    from github import GithubException
+except ImportError:
+    class GithubException(Exception):
+        def __init__(self, status, data=None, headers=None, message=None):
+            super().__init__(status, data)
+            self.status = status
+            self.data = data
+
+
+# Offline stand-in for the subset of PyGithub that GitHubManager uses.
+# Everything lives in memory; calls are counted so uploads can be measured without the network.
+
+def _as_bytes(content):
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return bytes(content)
+
+
+class FakeObject:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeGitRef:
+    def __init__(self, repo, ref, sha):
+        self.repo = repo
+        self.ref = ref
+        self.object = FakeObject(sha=sha)
+
+    def edit(self, sha, force=False):
+        self.repo.calls["ref.edit"] += 1
+        with self.repo.lock:
+            current = self.repo.refs[self.ref]
+            if not force and current is not None and not self.repo.is_ancestor(current, sha):
+                raise GithubException(422, {"message": "Update is not a fast forward"})
+            self.repo.refs[self.ref] = sha
+        self.object = FakeObject(sha=sha)
+
+
+class FakeRepository:
+    def __init__(self, full_name, default_branch="main"):
+        self.full_name = full_name
+        self.name = full_name.split("/")[-1]
+        self.default_branch = default_branch
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {f"refs/heads/{default_branch}": None}
+        self.calls = Counter()
+        self.lock = threading.RLock()
+
+    # --- Contents API ---
+
+    def _head_tree(self, branch=None):
+        head = self.refs.get(f"refs/heads/{branch or self.default_branch}")
+        if head is None:
+            return {}
+        return dict(self.trees[self.commits[head].tree.sha].entries)
+
+    def get_contents(self, path, ref=None):
+        self.calls["get_contents"] += 1
+        entries = self._head_tree(ref)
+        if path not in entries:
+            raise GithubException(404, {"message": "Not Found"})
+        sha = entries[path]
+        return FakeObject(path=path, sha=sha, decoded_content=self.blobs[sha])
+
+    def create_file(self, path, message, content, branch=None):
+        self.calls["create_file"] += 1
+        with self.lock:
+            if path in self._head_tree(branch):
+                raise GithubException(422, {"message": "sha wasn't supplied"})
+            return self._commit_single(path, message, content, branch)
+
+    def update_file(self, path, message, content, sha, branch=None):
+        self.calls["update_file"] += 1
+        with self.lock:
+            if self._head_tree(branch).get(path) != sha:
+                raise GithubException(409, {"message": f"{path} does not match {sha}"})
+            return self._commit_single(path, message, content, branch)
+
+    def _commit_single(self, path, message, content, branch):
+        data = _as_bytes(content)
+        sha = git_blob_sha(data)
+        self.blobs[sha] = data
+        entries = self._head_tree(branch)
+        entries[path] = sha
+        commit = self._store_commit(message, entries, branch)
+        return {"content": FakeObject(path=path, sha=sha), "commit": commit}
+
+    # --- Git Data API ---
+
+    def create_git_blob(self, content, encoding):
+        self.calls["create_git_blob"] += 1
+        data = base64.b64decode(content) if encoding == "base64" else content.encode("utf-8")
+        sha = git_blob_sha(data)
+        self.blobs[sha] = data
+        return FakeObject(sha=sha)
+
+    def get_git_ref(self, ref):
+        self.calls["get_git_ref"] += 1
+        full_ref = ref if ref.startswith("refs/") else f"refs/{ref}"
+        if self.refs.get(full_ref) is None:
+            # GitHub answers 409 for refs of an empty repository
+            raise GithubException(409 if full_ref in self.refs else 404, {"message": "Git Repository is empty."})
+        return FakeGitRef(self, full_ref, self.refs[full_ref])
+
+    def create_git_ref(self, ref, sha):
+        self.calls["create_git_ref"] += 1
+        with self.lock:
+            if self.refs.get(ref) is not None:
+                raise GithubException(422, {"message": "Reference already exists"})
+            self.refs[ref] = sha
+        return FakeGitRef(self, ref, sha)
+
+    def get_git_commit(self, sha):
+        self.calls["get_git_commit"] += 1
+        return self.commits[sha]
+
+    def create_git_tree(self, tree, base_tree=None):
+        self.calls["create_git_tree"] += 1
+        entries = dict(base_tree.entries) if base_tree is not None else {}
+        for element in tree:
+            identity = element._identity
+            if identity.get("sha") is None and "content" not in identity:
+                entries.pop(identity["path"], None)
+                continue
+            sha = identity.get("sha")
+            if sha is None:
+                sha = self.create_git_blob(base64.b64encode(_as_bytes(identity["content"])).decode(), "base64").sha
+            if sha not in self.blobs:
+                raise GithubException(422, {"message": f"Unknown blob {sha}"})
+            entries[identity["path"]] = sha
+        return self._store_tree(entries)
+
+    def create_git_commit(self, message, tree, parents):
+        self.calls["create_git_commit"] += 1
+        return self._new_commit(message, tree, parents)
+
+    def _new_commit(self, message, tree, parents):
+        sha = hashlib.sha1(f"{message}{tree.sha}{[p.sha for p in parents]}{len(self.commits)}".encode()).hexdigest()
+        commit = FakeObject(sha=sha, message=message, tree=tree, parents=list(parents))
+        self.commits[sha] = commit
+        return commit
+
+    def _store_tree(self, entries):
+        sha = hashlib.sha1(repr(sorted(entries.items())).encode()).hexdigest()
+        tree = FakeObject(sha=sha, entries=dict(entries))
+        self.trees[sha] = tree
+        return tree
+
+    def _store_commit(self, message, entries, branch):
+        ref = f"refs/heads/{branch or self.default_branch}"
+        head = self.refs.get(ref)
+        parents = [self.commits[head]] if head else []
+        commit = self._new_commit(message, self._store_tree(entries), parents)
+        self.refs[ref] = commit.sha
+        return commit
+
+    def is_ancestor(self, ancestor, sha):
+        pending = [sha]
+        while pending:
+            current = pending.pop()
+            if current == ancestor:
+                return True
+            pending.extend(parent.sha for parent in self.commits[current].parents)
+        return False
+
+    def files(self, branch=None):
+        return {path: self.blobs[sha] for path, sha in self._head_tree(branch).items()}
+
+    def export(self, target_dir, branch=None):
+        # Write the current branch content to disk, e.g. to inspect a benchmark run
+        for path, data in self.files(branch).items():
+            file_path = os.path.join(target_dir, path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(data)
+
+
+class FakeUser:
+    def __init__(self, login):
+        self.login = login
+        self.repos = {}
+
+    def get_repo(self, name):
+        if name not in self.repos:
+            raise GithubException(404, {"message": "Not Found"})
+        return self.repos[name]
+
+    def create_repo(self, name):
+        self.repos[name] = FakeRepository(f"{self.login}/{name}")
+        return self.repos[name]
+
+
+class FakeGithub:
+    def __init__(self, token=None, login="offline"):
+        self.user = FakeUser(login)
+
+    def get_user(self):
+        return self.user
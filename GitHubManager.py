@@ -1,21 +1,66 @@
-from github import Github, GithubException
+import base64
+import hashlib
+import json
 import os
+import threading
+import zipfile
+from io import BytesIO
+
+
+def _pygithub():
+    # PyGithub takes about a third of a second to import, so it is only loaded once it is needed
+    import github
+    return github
+
 
 class GitHubManager:
-    def __init__(self, token, repo_name):
-        self.github = Github(token)
-        try:
-            self.repo = self.github.get_user().get_repo(repo_name)
-            print(f"Repository {repo_name} already exists, using existing repository.")
-        except Exception:
-            self.repo = self.github.get_user().create_repo(repo_name)
-            print(f"Repository {repo_name} created.")
-    
+    def __init__(self, token, repo_name, github=None, sha_cache_path=None):
+        # GITHUB_BACKEND=fake uses the in-memory FakeGitHub backend, no network needed
+        if github is None and os.getenv('GITHUB_BACKEND', 'github').lower() == 'fake':
+            from FakeGitHub import FakeGithub
+            github = FakeGithub(token)
+        self.token = token
+        self.repo_name = repo_name
+        # Part of the sha cache keys: shas of an offline run must never be taken for those on GitHub
+        self.backend = 'github' if github is None else type(github).__name__.lower()
+        # Client and repository are connected on first use: runs that publish nothing (every
+        # stage up to date, or unchanged uploads) make no GitHub round trips at all
+        self._github = github
+        self._repo = None
+
+        # Known blob shas per path, so updates don't need a get_contents round trip first
+        self.sha_cache_path = sha_cache_path or os.getenv('GITHUB_SHA_CACHE', '.github_sha_cache.json')
+        self.sha_cache = self._load_sha_cache()
+        # Commits on the same branch have to be serialized when several pipelines run in parallel
+        self.lock = threading.RLock()
+
+    @property
+    def github(self):
+        with self.lock:
+            if self._github is None:
+                self._github = _pygithub().Github(self.token)
+            return self._github
+
+    @property
+    def repo(self):
+        with self.lock:
+            if self._repo is None:
+                try:
+                    self._repo = self.github.get_user().get_repo(self.repo_name)
+                    print(f"Repository {self.repo_name} already exists, using existing repository.")
+                except Exception:
+                    self._repo = self.github.get_user().create_repo(self.repo_name)
+                    print(f"Repository {self.repo_name} created.")
+                # Remembered, so later runs can check the sha cache without connecting
+                self.sha_cache[self._repository_key()] = self._repo.full_name
+                self._save_sha_cache()
+            return self._repo
+
     def commit_file(self, file_path, content, commit_message):
         with open(file_path, 'w') as f:
             f.write(content)
         self.repo.create_file(file_path, commit_message, content)
-    
+
     def read_file(self, file_path):
         return self.repo.get_contents(file_path).decoded_content.decode()
 
@@ -23,11 +68,141 @@ class GitHubManager:
         return self.repo.get_contents(file_path)
 
     def update_file(self, file_path, commit_message, content, sha):
-        self.repo.update_file(file_path, commit_message, content, sha)
+        self.repo.update_file(file_path, commit_message, self._as_bytes(content), sha)
 
     def create_file(self, file_path, commit_message, content):
-        self.repo.create_file(file_path, commit_message, content)
+        self.repo.create_file(file_path, commit_message, self._as_bytes(content))
+
+    def upsert_file(self, file_path, commit_message, content):
+        # Create or update a single file, using the locally cached sha when it is known
+        content = self._as_bytes(content)
+        with self.lock:
+            sha = self.sha_cache.get(self._cache_key(file_path))
+            if sha == git_blob_sha(content):
+                print(f"{file_path} is unchanged on GitHub, skipping upload.")
+                return sha
+            try:
+                if sha:
+                    result = self.repo.update_file(file_path, commit_message, content, sha)
+                else:
+                    result = self.repo.create_file(file_path, commit_message, content)
+            except self.GithubException as e:
+                # Cached sha is stale (409/422) or the file already exists: ask GitHub for the current one
+                if e.status not in (404, 409, 422):
+                    raise e
+                try:
+                    existing_file = self.repo.get_contents(file_path)
+                    result = self.repo.update_file(file_path, commit_message, content, existing_file.sha)
+                except self.GithubException as e:
+                    if e.status != 404:
+                        raise e
+                    # File does not exist, create it
+                    result = self.repo.create_file(file_path, commit_message, content)
+
+            sha = result["content"].sha
+            self.sha_cache[self._cache_key(file_path)] = sha
+            self._save_sha_cache()
+            return sha
+
+    def publish_files(self, files, commit_message, branch=None):
+        # Publish many files in one commit via the Git Data API:
+        # one blob per changed file, then one tree, one commit and one ref update
+        branch = branch or self.repo.default_branch
+        with self.lock:
+            try:
+                ref = self.repo.get_git_ref(f"heads/{branch}")
+                base_commit = self.repo.get_git_commit(ref.object.sha)
+            except self.GithubException as e:
+                # 409/404: the repository (or branch) has no commits yet
+                if e.status not in (404, 409):
+                    raise e
+                ref = None
+                base_commit = None
+
+            elements = []
+            new_shas = {}
+            for file_path, content in files.items():
+                data = self._as_bytes(content)
+                if isinstance(data, str):
+                    data = data.encode('utf-8')
+                sha = git_blob_sha(data)
+                if base_commit is not None and self.sha_cache.get(self._cache_key(file_path)) == sha:
+                    continue
+                blob = self.repo.create_git_blob(base64.b64encode(data).decode('ascii'), 'base64')
+                elements.append(_pygithub().InputGitTreeElement(file_path, '100644', 'blob', sha=blob.sha))
+                new_shas[file_path] = blob.sha
+
+            if not elements:
+                print("All files are unchanged on GitHub, nothing to publish.")
+                return None
+
+            if base_commit is not None:
+                tree = self.repo.create_git_tree(elements, base_commit.tree)
+                commit = self.repo.create_git_commit(commit_message, tree, [base_commit])
+                ref.edit(commit.sha)
+            else:
+                tree = self.repo.create_git_tree(elements)
+                commit = self.repo.create_git_commit(commit_message, tree, [])
+                self.repo.create_git_ref(f"refs/heads/{branch}", commit.sha)
+
+            for file_path, sha in new_shas.items():
+                self.sha_cache[self._cache_key(file_path)] = sha
+            self._save_sha_cache()
+            print(f"Published {len(elements)} files in commit {commit.sha[:7]}.")
+            return commit.sha
+
+    def publish_codebase(self, zip_path, archive, commit_message, extract_dir=None):
+        # GITHUB_PUBLISH_FILES=1 additionally publishes the unpacked files, all in one commit
+        if os.getenv('GITHUB_PUBLISH_FILES', '0') != '1':
+            return self.upsert_file(zip_path, commit_message, archive)
+
+        extract_dir = extract_dir or os.path.splitext(zip_path)[0]
+        files = {zip_path: archive}
+        with zipfile.ZipFile(BytesIO(archive)) as zipf:
+            for name in zipf.namelist():
+                if not name.endswith('/'):
+                    files[f"{extract_dir}/{name}"] = zipf.read(name)
+        return self.publish_files(files, commit_message)
+
+    def _repository_key(self):
+        # The owner depends on the backend and the token; only a hash of the token is stored
+        token_id = hashlib.sha256(str(self.token).encode('utf-8')).hexdigest()[:16] if self.token else 'anonymous'
+        return f"repository:{self.backend}:{token_id}:{self.repo_name}"
+
+    def _cache_key(self, file_path):
+        full_name = self._repo.full_name if self._repo is not None else self.sha_cache.get(self._repository_key())
+        full_name = full_name or self.repo.full_name
+        return f"{full_name}:{file_path}" if self.backend == 'github' else f"{self.backend}:{full_name}:{file_path}"
+
+    def _load_sha_cache(self):
+        if os.path.exists(self.sha_cache_path):
+            try:
+                with open(self.sha_cache_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save_sha_cache(self):
+        tmp_path = self.sha_cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.sha_cache, f, indent=2)
+        os.replace(tmp_path, self.sha_cache_path)
+
+    @staticmethod
+    def _as_bytes(content):
+        # PyGithub only accepts str or bytes, packaged codebases are passed around as memoryview
+        if isinstance(content, (memoryview, bytearray)):
+            return bytes(content)
+        return content
 
     @property
     def GithubException(self):
-        return GithubException
\ No newline at end of file
+        return _pygithub().GithubException
+
+
+def git_blob_sha(data):
+    # Same sha GitHub reports for a file, so unchanged files can be detected locally
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
@@ -0,0 +1,401 @@
+import ast
+import glob
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import zipfile
+
+from RateLimiter import estimate_tokens
+
+# Status codes that are worth retrying (rate limit and transient server errors)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class BackendError(Exception):
+    def __init__(self, message, status=None, retries=0, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retries = retries
+        # Seconds the server asked us to wait (Retry-After of a 429), if it said so
+        self.retry_after = retry_after
+
+
+class OpenAIBackend:
+    # Chat completions over HTTP; works with api.openai.com and OpenAI-compatible servers (LM Studio, ...)
+    def __init__(self, api_url=None, api_key=None, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None, name="openai", structured_output=None):
+        self.name = name
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.api_url = api_url or os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+
+        if not self.api_key:
+            raise ValueError("OpenAI API key is not configured")
+
+        # Connection pool and retry settings, overridable via .env
+        self.pool_size = pool_size or int(os.getenv("LLM_POOL_SIZE", "10"))
+        self.connect_timeout = connect_timeout or float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+        # Reasoning models can take several minutes for large codebases
+        self.read_timeout = read_timeout or float(os.getenv("LLM_READ_TIMEOUT", "600"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "4"))
+        self.backoff_base = backoff_base or float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+        self.backoff_max = backoff_max or float(os.getenv("LLM_BACKOFF_MAX", "60"))
+        # response_format json_schema; turn it off for OpenAI-compatible servers that reject it
+        self.structured_output = os.getenv("LLM_STRUCTURED_OUTPUT", "on").lower() == "on" \
+            if structured_output is None else structured_output
+
+        # Created on the first call: runs served from the cache never import requests
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        # One keep-alive session for all calls, so only the first prompt pays for TCP+TLS
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                })
+                self._session = session
+            return self._session
+
+    def model_for(self, stage):
+        # Single model backend: the reasoner's model is used for every stage
+        return None
+
+    def supports_schema(self, stage=None):
+        return self.structured_output
+
+    def complete(self, payload, stage=None):
+        # Returns (message, usage, status, retries, model)
+        response, retries = self._post(payload)
+        try:
+            result = response.json()
+            message = result["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as error:
+            # A 200 without a completion (proxy error page, truncated body, ...)
+            print("Malformed response from LM Studio API:", error)
+            raise BackendError(f"Malformed response: {type(error).__name__}: {error}",
+                               response.status_code, retries) from error
+        return message, result.get("usage"), response.status_code, retries, payload["model"]
+
+    def stream(self, payload, stage=None, result=None):
+        # Yields the completion in pieces as the server sends them (SSE); usage, status and
+        # retries are put into result once the stream is exhausted
+        import requests
+
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        response, retries = self._post(payload, stream=True)
+        usage = None
+        # A stream that ends without [DONE] or stopped at max_tokens holds a cut-off answer
+        done = False
+        finish_reason = None
+        with response:
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        done = True
+                        break
+                    event = json.loads(data)
+                    usage = event.get("usage") or usage
+                    for choice in event.get("choices", []):
+                        finish_reason = choice.get("finish_reason") or finish_reason
+                        piece = choice.get("delta", {}).get("content")
+                        if piece:
+                            yield piece
+            except (requests.exceptions.RequestException, ValueError, AttributeError) as error:
+                # The connection broke off mid-stream or the server sent something that is not an event
+                print("Error reading the LM Studio API stream:", error)
+                raise BackendError(f"Stream failed: {type(error).__name__}: {error}",
+                                   response.status_code, retries) from error
+        if result is not None:
+            result.update(usage=usage, status=response.status_code, retries=retries, model=payload["model"],
+                          truncated=not done or finish_reason == "length")
+
+    def _post(self, payload, stream=False):
+        import requests
+
+        # Retries are only possible until the first byte arrived
+        retries = 0
+        while True:
+            try:
+                response = self.session.post(self.api_url, json=payload, stream=stream,
+                                             timeout=(self.connect_timeout, self.read_timeout))
+                if response.status_code in RETRY_STATUS_CODES and retries < self.max_retries:
+                    delay = self._backoff_delay(retries, response.headers.get("Retry-After"))
+                    response.close()
+                    print(f"LM Studio API returned {response.status_code}, retrying in {delay:.1f}s")
+                    retries += 1
+                    time.sleep(delay)
+                    continue
+                response.raise_for_status()
+                return response, retries
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+                if retries < self.max_retries:
+                    delay = self._backoff_delay(retries)
+                    print(f"Error calling LM Studio API ({error}), retrying in {delay:.1f}s")
+                    retries += 1
+                    time.sleep(delay)
+                    continue
+                print("Error calling LM Studio API:", error)
+                raise BackendError(str(error), None, retries) from error
+            except requests.exceptions.RequestException as error:
+                status = error.response.status_code if error.response is not None else None
+                retry_after = None
+                if error.response is not None and error.response.headers.get("Retry-After"):
+                    retry_after = self._backoff_delay(retries, error.response.headers["Retry-After"])
+                print("Error calling LM Studio API:", error)
+                raise BackendError(str(error), status, retries, retry_after) from error
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        # Respect the server's Retry-After header if it sends one
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+# Recorded artifact per agent stage, relative to the project directory; the first existing one wins
+REPLAY_ARTIFACTS = {
+    "GoalAnalysisAgent": ["outputs/refined_goals.txt"],
+    "EnvironmentAnalysisAgent": ["outputs/refined_environment.txt"],
+    "SpecificationGenerationAgent": ["outputs/system_specifications.txt"],
+    "ArchitectureDesignAgent": ["outputs/system_architecture.txt"],
+    "CodeGenerationAgent": ["outputs/generated_codebase"],
+    "SingleCodeGenerationAgent": ["outputs_single/generated_codebase", "outputs/generated_codebase"],
+    "FeedbackCodeGenerationAgent": ["outputs/generated_codebase_with_feedback", "outputs/generated_codebase"],
+}
+
+# Files whose content identifies the project a prompt belongs to, most specific first:
+# many projects share the same environment, so a matching goal outweighs a matching environment
+REPLAY_CONTEXT_FILES = ["inputs/goals.txt", "outputs/refined_goals.txt", "outputs/system_specifications.txt",
+                        "outputs/system_architecture.txt", "inputs/environment.txt",
+                        "outputs/refined_environment.txt"]
+
+FILE_PROMPT_PATTERN = re.compile(r"Implement the file (\S+) of the system")
+# Part of the edits response format of patch-mode feedback prompts
+EDITS_PROMPT_MARKER = '"edits": ['
+
+
+class ReplayBackend:
+    # Serves the committed projects/*/outputs artifacts as recorded responses, with synthetic
+    # latency, so the pipeline can be run and profiled without network access or API key
+    def __init__(self, projects_dir=None, latency=None, tokens_per_second=None, project=None, name="replay"):
+        self.name = name
+        self.projects_dir = projects_dir or os.getenv("REPLAY_PROJECTS_DIR", "projects")
+        # Fixed delay per call plus generation time proportional to the completion length
+        self.latency = float(os.getenv("REPLAY_LATENCY", "0")) if latency is None else latency
+        self.tokens_per_second = float(os.getenv("REPLAY_TOKENS_PER_SECOND", "0")) \
+            if tokens_per_second is None else tokens_per_second
+        self.project = project or os.getenv("REPLAY_PROJECT")
+        self.contexts = None
+        self.last_project = None
+        # Pipeline stages run in parallel threads and share contexts and last_project
+        self._lock = threading.Lock()
+
+    def model_for(self, stage):
+        return None
+
+    def supports_schema(self, stage=None):
+        # Recorded answers are returned as they are, the reasoner validates them locally
+        return False
+
+    def complete(self, payload, stage=None):
+        prompt = payload["messages"][-1]["content"]
+        message = self.lookup(prompt, stage)
+        usage = self._usage(prompt, message)
+        time.sleep(self.latency + self._generation_time(usage))
+        return message, usage, 200, 0, payload["model"]
+
+    def stream(self, payload, stage=None, result=None):
+        prompt = payload["messages"][-1]["content"]
+        message = self.lookup(prompt, stage)
+        usage = self._usage(prompt, message)
+        time.sleep(self.latency)
+        chunk_size = 256
+        delay = self._generation_time(usage) * chunk_size / max(len(message), 1)
+        for i in range(0, len(message), chunk_size):
+            if delay:
+                time.sleep(delay)
+            yield message[i:i + chunk_size]
+        if result is not None:
+            result.update(usage=usage, status=200, retries=0, model=payload["model"])
+
+    def lookup(self, prompt, stage):
+        stage = stage or ""
+        base_stage, _, substage = stage.partition(".")
+        if substage == "recovery":
+            # Recorded codebases are complete, there is nothing missing to hand out
+            return json.dumps({"files": []})
+        if base_stage not in REPLAY_ARTIFACTS:
+            raise BackendError(f"No recorded responses for stage {stage or 'unknown'}")
+
+        project_dir = self._find_project(prompt, base_stage)
+        message = self._read_artifact(project_dir, REPLAY_ARTIFACTS[base_stage])
+        if substage == "manifest":
+            files = json.loads(message)["files"]
+            return json.dumps({"files": [{"filename": file_info["filename"], "purpose": "",
+                                          "interface": file_info["content"][:2000]} for file_info in files]})
+        if substage == "file":
+            match = FILE_PROMPT_PATTERN.search(prompt)
+            for file_info in json.loads(message)["files"]:
+                if match and file_info["filename"] == match.group(1):
+                    return file_info["content"]
+            return ""
+        if base_stage == "FeedbackCodeGenerationAgent" and EDITS_PROMPT_MARKER in prompt:
+            # Patch mode asks for edit operations: the recorded files are replayed as full rewrites
+            return json.dumps({"edits": [{"filename": file_info["filename"], "action": "create", "diff": None,
+                                          "content": file_info["content"]}
+                                         for file_info in json.loads(message)["files"]]}, ensure_ascii=False)
+        return message
+
+    def _find_project(self, prompt, stage):
+        with self._lock:
+            if self.contexts is None:
+                self.contexts = self._load_contexts()
+            candidates = [(project_dir, texts) for project_dir, texts in self.contexts
+                          if any(self._artifact_exists(project_dir, artifact) for artifact in REPLAY_ARTIFACTS[stage])]
+            if self.project:
+                candidates = [item for item in candidates if os.path.basename(item[0]) == self.project] or candidates
+            if not candidates:
+                raise BackendError(f"No project in {self.projects_dir} has a recorded response for {stage}")
+            # Project whose recorded documents appear in the prompt, weighted by how specific they are;
+            # on a tie the project of the previous call wins, so one pipeline run stays on one project
+            last_project = self.last_project
+
+            def score(item):
+                project_dir, texts = item
+                matched = sum(weight * len(text) for weight, text in texts if text in prompt)
+                return matched, project_dir == last_project
+            best = max(candidates, key=score)[0]
+            self.last_project = best
+            return best
+
+    def _load_contexts(self):
+        contexts = []
+        for project_dir in sorted(glob.glob(os.path.join(self.projects_dir, "*"))):
+            if not os.path.isdir(os.path.join(project_dir, "outputs")):
+                continue
+            texts = []
+            for priority, name in enumerate(REPLAY_CONTEXT_FILES):
+                path = os.path.join(project_dir, name)
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read().strip()
+                    if text:
+                        # A prefix is enough and still matches when a prompt truncates the document
+                        texts.append((len(REPLAY_CONTEXT_FILES) - priority, text[:2000]))
+            contexts.append((project_dir, texts))
+        return contexts
+
+    @staticmethod
+    def _artifact_exists(project_dir, artifact):
+        path = os.path.join(project_dir, artifact)
+        return os.path.isfile(path) or os.path.isfile(path + ".txt") or os.path.isfile(path + ".zip")
+
+    @staticmethod
+    def _read_artifact(project_dir, artifacts):
+        for artifact in artifacts:
+            path = os.path.join(project_dir, artifact)
+            if os.path.isfile(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    return f.read()
+            if not os.path.isfile(path + ".txt") and not os.path.isfile(path + ".zip"):
+                continue
+            # Codebases: the .txt holds the JSON, or in older runs the repr of the zip bytes
+            if os.path.isfile(path + ".txt"):
+                with open(path + ".txt", "r", encoding="utf-8") as f:
+                    text = f.read()
+                if not text.startswith(("b'", 'b"')):
+                    return text
+                data = io.BytesIO(ast.literal_eval(text))
+            else:
+                data = path + ".zip"
+            with zipfile.ZipFile(data) as zipf:
+                files = [{"filename": name, "content": zipf.read(name).decode("utf-8", errors="replace")}
+                         for name in zipf.namelist() if not name.endswith("/") and not name.startswith("inputs")]
+            return json.dumps({"files": files}, ensure_ascii=False, indent=2)
+        raise BackendError(f"No recorded artifact in {project_dir}")
+
+    @staticmethod
+    def _usage(prompt, message):
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(message)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _generation_time(self, usage):
+        if not self.tokens_per_second:
+            return 0.0
+        return usage["completion_tokens"] / self.tokens_per_second
+
+
+class DryRunBackend(ReplayBackend):
+    # Stands in for the real backend in a dry run (main.py --dry-run): every call is answered at once
+    # with the recorded output of the project (or of the most similar recorded project), so later
+    # stages get prompts of realistic size; calls without any recording get a placeholder answer
+    # billed with DRY_RUN_COMPLETION_TOKENS
+    def __init__(self, target, projects_dir=None, project=None, completion_tokens=None, name="dry-run"):
+        super().__init__(projects_dir, latency=0, tokens_per_second=0, project=project, name=name)
+        # The backend a real run would use: it picks the models and the cache entries to look up
+        self.target = target
+        self.cache_namespace = target.name
+        self.completion_tokens = int(os.getenv("DRY_RUN_COMPLETION_TOKENS", "4000")) \
+            if completion_tokens is None else completion_tokens
+
+    def model_for(self, stage):
+        return self.target.model_for(stage)
+
+    def supports_schema(self, stage=None):
+        # Same payload, and so the same cache key, as the real call
+        return self.target.supports_schema(stage)
+
+    def complete(self, payload, stage=None):
+        message, usage = self._answer(payload["messages"][-1]["content"], stage)
+        return message, usage, 200, 0, payload["model"]
+
+    def stream(self, payload, stage=None, result=None):
+        message, usage = self._answer(payload["messages"][-1]["content"], stage)
+        yield message
+        if result is not None:
+            result.update(usage=usage, status=200, retries=0, model=payload["model"])
+
+    def _answer(self, prompt, stage):
+        try:
+            message = self.lookup(prompt, stage)
+            return message, self._usage(prompt, message)
+        except BackendError:
+            prompt_tokens = estimate_tokens(prompt)
+            return json.dumps({"files": [], "edits": []}), {
+                "prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                "total_tokens": prompt_tokens + self.completion_tokens}
+
+
+def create_backend(name=None):
+    # LLM_BACKEND=openai (default), replay or router (per-stage routes from LLM_ROUTES)
+    name = (name or os.getenv("LLM_BACKEND", "openai")).lower()
+    if name == "replay":
+        return ReplayBackend()
+    if name == "router":
+        from LLMRouter import LLMRouter
+        return LLMRouter.from_config()
+    if name == "openai":
+        return OpenAIBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -1,46 +1,205 @@
+import copy
 import os
-import requests
-import openai
-from dotenv import load_dotenv
+import time
+from LLMBackends import BackendError, OpenAIBackend, create_backend
+from ResponseCache import ResponseCache
+from RateLimiter import create_rate_limiter, estimate_tokens
+from StructuredOutput import parse_response, response_format
+from Telemetry import Telemetry
+
+# Load environment variables from .env file; python-dotenv is only imported if there is one
+ENV_FILE = next((path for path in (os.path.join(os.getcwd(), '.env'),
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+                 if os.path.exists(path)), None)
+if ENV_FILE:
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
-# Load environment variables from .env file
-load_dotenv()
 
 class LLMReasoner:
-    def __init__(self):
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.api_url = "https://api.openai.com/v1/chat/completions"
-
-        if not self.api_key:
-            raise ValueError("OpenAI API key is not configured")
-
-    def get_chat_response(self, prompt):
-        print("Using API Key:", self.api_key)
-        
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_base=None, backoff_max=None, cache=None,
+                 rate_limiter=None, telemetry=None, backend=None, model=None):
+        # Backend that actually produces completions: OpenAI-compatible HTTP API (default)
+        # or the offline replay of recorded project outputs, see LLMBackends / LLM_BACKEND
+        if backend is None and os.getenv("LLM_BACKEND", "openai").lower() == "openai":
+            backend = OpenAIBackend(pool_size=pool_size, connect_timeout=connect_timeout,
+                                    read_timeout=read_timeout, max_retries=max_retries,
+                                    backoff_base=backoff_base, backoff_max=backoff_max)
+        self.backend = backend or create_backend()
+        self.model = model or os.getenv("LLM_MODEL", "o3-mini")
+
+        # Prompt-response cache on disk, see ResponseCache for the LLM_CACHE switches
+        self.cache = cache if cache is not None else ResponseCache()
+
+        # Optional rate limiter shared by all pipelines of a batch run, or by all processes on this
+        # machine (SharedRateLimiter, enabled via LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else create_rate_limiter()
+        # With a rate limiter, calls that still get a 429 are queued again instead of failing
+        self.max_queue_wait = float(os.getenv("LLM_QUEUE_MAX_WAIT", "1800"))
+
+        # Per-call statistics (stage, tokens, latency, retries, cache hits), optionally traced to JSONL
+        self.telemetry = telemetry or Telemetry()
+
+    @property
+    def call_stats(self):
+        return self.telemetry.records
+
+    def with_telemetry(self, telemetry):
+        # Same session, cache and rate limiter, but calls are recorded to another trace (e.g. per project)
+        reasoner = copy.copy(self)
+        reasoner.telemetry = telemetry
+        return reasoner
+
+    def get_chat_response(self, prompt, refresh=False, stage=None, schema=None):
+        # schema (see StructuredOutput) is enforced by the server where the backend supports it,
+        # otherwise the response is validated locally and schema errors are recorded in the telemetry
+        payload = self._payload(prompt, stage, schema)
+
+        start = time.perf_counter()
+        cache_key = self._cache_key(payload, prompt)
+        if not refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_call(start, 0, None, stage, payload["model"], cache_hit=True)
+                print(f"LM Studio Response for {stage or 'prompt'} loaded from cache.")
+                return cached
+
+        estimated_tokens = estimate_tokens(prompt)
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated_tokens)
+
+        requeues = 0
+        while True:
+            try:
+                message, usage, status, retries, model = self.backend.complete(payload, stage=stage)
+                break
+            except BackendError as error:
+                if not self._requeue(error, estimated_tokens, stage, start, requeues):
+                    self._record_call(start, error.retries, error.status, stage, payload["model"], error=str(error))
+                    if self.rate_limiter:
+                        self.rate_limiter.release(estimated_tokens)
+                    raise
+                requeues += 1
+
+        if self.rate_limiter:
+            used_tokens = (usage or {}).get("total_tokens", estimated_tokens)
+            self.rate_limiter.adjust(used_tokens - estimated_tokens)
+        # The model that answered, which differs from the requested one after a failover
+        schema_errors = self._schema_errors(message, payload, schema, stage)
+        self._record_call(start, retries, status, stage, model, usage, schema_errors=schema_errors)
+        # A response that does not match its schema is not cached, so the next run asks again
+        if not schema_errors:
+            self.cache.set(cache_key, message, {"model": model, "usage": usage})
+        return message
+
+    def stream_chat_response(self, prompt, refresh=False, stage=None, schema=None):
+        # Yields the completion in pieces as the backend produces them, so callers can
+        # start processing before the whole answer is generated
+        payload = self._payload(prompt, stage, schema)
+
+        start = time.perf_counter()
+        # Streamed and non-streamed calls share cache entries
+        cache_key = self._cache_key(payload, prompt)
+        if not refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record_call(start, 0, None, stage, payload["model"], cache_hit=True)
+                print(f"LM Studio Response for {stage or 'prompt'} loaded from cache.")
+                yield cached
+                return
+
+        estimated_tokens = estimate_tokens(prompt)
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated_tokens)
+
+        parts = []
+        result = {}
+        requeues = 0
+        while True:
+            try:
+                for piece in self.backend.stream(payload, stage=stage, result=result):
+                    parts.append(piece)
+                    yield piece
+                break
+            except BackendError as error:
+                # A 429 arrives before the first piece, so nothing was yielded yet
+                if parts or not self._requeue(error, estimated_tokens, stage, start, requeues):
+                    self._record_call(start, error.retries, error.status, stage, payload["model"], error=str(error))
+                    if self.rate_limiter and not parts:
+                        # Nothing was generated; a stream that broke off did use the provider's capacity
+                        self.rate_limiter.release(estimated_tokens)
+                    raise
+                requeues += 1
+
+        message = "".join(parts)
+        usage = result.get("usage")
+        if self.rate_limiter:
+            used_tokens = (usage or {}).get("total_tokens", estimated_tokens)
+            self.rate_limiter.adjust(used_tokens - estimated_tokens)
+        model = result.get("model", payload["model"])
+        schema_errors = self._schema_errors(message, payload, schema, stage)
+        self._record_call(start, result.get("retries", 0), result.get("status"), stage, model, usage,
+                          schema_errors=schema_errors)
+        if result.get("truncated"):
+            print(f"Response for {stage or 'prompt'} was cut off, not caching it.")
+        elif not schema_errors:
+            self.cache.set(cache_key, message, {"model": model, "usage": usage})
+
+    def _payload(self, prompt, stage, schema):
         payload = {
-            "model": "o3-mini",  # Specify GPT-4 or any other model
+            # A router backend picks the model per stage
+            "model": self.backend.model_for(stage) or self.model,
             "messages": [{"role": "user", "content": prompt}]
         }
+        if schema and self.backend.supports_schema(stage):
+            payload["response_format"] = response_format(schema)
+        return payload
+
+    def _schema_errors(self, message, payload, schema, stage):
+        # One C-level decode; with server-side enforcement this only fails for cut-off responses
+        if not schema:
+            return None
+        _, errors = parse_response(message, schema)
+        if errors:
+            enforced = "enforced" if "response_format" in payload else "local"
+            print(f"Response for {stage or 'prompt'} does not match the {schema['name']} schema ({enforced}): "
+                  f"{errors[0]}{f' (+{len(errors) - 1} more)' if len(errors) > 1 else ''}")
+        return errors
+
+    def _requeue(self, error, estimated_tokens, stage, start, requeues):
+        # Rate limited although the backend retried: pause every pipeline sharing the limiter and
+        # queue the call again, until LLM_QUEUE_MAX_WAIT is used up
+        if error.status != 429 or not self.rate_limiter or time.perf_counter() - start > self.max_queue_wait:
+            return False
+        delay = error.retry_after or min(60.0, 5.0 * (2 ** requeues))
+        print(f"Rate limited on {stage or 'prompt'}, queueing the call again in {delay:.1f}s")
+        # The rejected call did not use its request and tokens, they are charged again on requeue
+        self.rate_limiter.release(estimated_tokens)
+        self.rate_limiter.pause(delay)
+        self.rate_limiter.acquire(estimated_tokens)
+        return True
+
+    def _cache_key(self, payload, prompt):
+        # Responses of other backends (e.g. replayed ones) must never be served as OpenAI answers;
+        # a dry run looks up the entries of the backend it stands in for
+        name = getattr(self.backend, "cache_namespace", self.backend.name)
+        model = payload["model"] if name == "openai" else f"{name}/{payload['model']}"
+        return self.cache.make_key(model, payload, prompt)
 
-        try:
-            response = requests.post(self.api_url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            result = response.json()
-            message = result["choices"][0]["message"]["content"]
-            print("LM Studio Response received:", message)
-            return message
-        except requests.exceptions.RequestException as error:
-            print("Error calling LM Studio API:", error)
-            raise
+    def _record_call(self, start, retries, status, stage=None, model=None, usage=None, cache_hit=False, error=None,
+                     schema_errors=None):
+        stats = self.telemetry.record(stage, model, time.perf_counter() - start, retries=retries, status=status,
+                                      cache_hit=cache_hit, usage=usage, error=error, schema_errors=schema_errors)
+        print(f"LLM call for {stats['stage']} finished in {stats['latency']:.2f}s: "
+              f"{stats['prompt_tokens']} prompt ({stats['cached_tokens']} cached) / "
+              f"{stats['completion_tokens']} completion tokens, "
+              f"{retries} retries{' (cache hit)' if cache_hit else ''}")
+        return stats
 
 # Example usage
 if __name__ == "__main__":
     ai_client = LLMReasoner()
     response = ai_client.get_chat_response("Hello, how are you?")
     print("AI Response:", response)
+    print("Call stats:", ai_client.call_stats)
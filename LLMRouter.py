@@ -0,0 +1,216 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from LLMBackends import BackendError, OpenAIBackend, ReplayBackend
+
+# Example llm_routes.json:
+# {
+#   "backends": {
+#     "openai": {"type": "openai"},
+#     "lmstudio": {"type": "openai", "api_url": "http://localhost:1234/v1/chat/completions", "api_key": "lm-studio"}
+#   },
+#   "routes": {
+#     "GoalAnalysisAgent": [{"backend": "lmstudio", "model": "qwen2.5-7b-instruct"},
+#                           {"backend": "openai", "model": "gpt-4o-mini"}],
+#     "CodeGenerationAgent": [{"backend": "openai", "model": "o3-mini"}],
+#     "default": [{"backend": "openai", "model": "o3-mini"}]
+#   },
+#   "hedging": {"max_p95": 60, "min_samples": 5}
+# }
+
+
+def create_route_backend(name, config):
+    kind = config.get("type", "openai")
+    if kind == "openai":
+        api_key = config.get("api_key") or os.getenv(config.get("api_key_env", "OPENAI_API_KEY"))
+        return OpenAIBackend(api_url=config.get("api_url"), api_key=api_key, max_retries=config.get("max_retries"),
+                             read_timeout=config.get("read_timeout"), name=name,
+                             structured_output=config.get("structured_output"))
+    if kind == "replay":
+        return ReplayBackend(config.get("projects_dir"), latency=config.get("latency"),
+                             tokens_per_second=config.get("tokens_per_second"), name=name)
+    raise ValueError(f"Unknown backend type for {name}: {kind}")
+
+
+class LatencyWindow:
+    # Latencies of the last calls of one backend/model
+    def __init__(self, size=50):
+        self.samples = deque(maxlen=size)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def p95(self):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+class LLMRouter:
+    # Backend that maps each agent stage to an ordered list of backend/model routes:
+    # the first route serves the call, later ones take over when it fails (failover) or when
+    # its p95 latency has degraded beyond hedging.max_p95 and it is slow again (hedged request)
+    name = "router"
+
+    def __init__(self, backends, routes, max_p95=None, min_samples=5, cooldown=60.0):
+        # A route to an unknown backend would only fail on the first call of its stage
+        for stage, stage_routes in routes.items():
+            for route in stage_routes:
+                if route.get("backend") not in backends:
+                    raise ValueError(f"Route for {stage} uses unknown backend {route.get('backend')}")
+            if not stage_routes:
+                raise ValueError(f"No routes listed for {stage}")
+        self.backends = backends
+        self.routes = routes
+        self.max_p95 = max_p95
+        self.min_samples = min_samples
+        # A backend that failed is skipped for this many seconds, unless no other route is left
+        self.cooldown = cooldown
+        self.latencies = {}
+        self.failed_until = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "8")))
+
+    @classmethod
+    def from_config(cls, path=None):
+        path = path or os.getenv("LLM_ROUTES", "llm_routes.json")
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        backends = {name: create_route_backend(name, backend_config)
+                    for name, backend_config in config.get("backends", {}).items()}
+        routes = config.get("routes", {})
+        hedging = config.get("hedging", {})
+        return cls(backends, routes, max_p95=hedging.get("max_p95"), min_samples=hedging.get("min_samples", 5),
+                   cooldown=config.get("cooldown", 60.0))
+
+    def routes_for(self, stage):
+        # "CodeGenerationAgent.file" falls back to "CodeGenerationAgent", then to "default"
+        stage = stage or ""
+        candidates = [stage, stage.partition(".")[0], "default"]
+        for name in candidates:
+            if name in self.routes:
+                routes = self.routes[name]
+                break
+        else:
+            raise BackendError(f"No route configured for stage {stage or 'unknown'}")
+        now = time.time()
+        healthy = [route for route in routes if self.failed_until.get(route["backend"], 0) <= now]
+        return healthy or routes
+
+    def model_for(self, stage):
+        # Called while the request is built: a stage without route fails in complete()/stream()
+        # instead, where the reasoner records the error
+        try:
+            return self.routes_for(stage)[0].get("model")
+        except BackendError:
+            return None
+
+    def supports_schema(self, stage=None):
+        try:
+            return self.backends[self.routes_for(stage)[0]["backend"]].supports_schema(stage)
+        except BackendError:
+            return False
+
+    def _routed(self, route, payload, stage):
+        routed = {**payload, "model": route.get("model", payload["model"])}
+        if not self.backends[route["backend"]].supports_schema(stage):
+            # A fallback backend without structured output gets the plain request
+            routed.pop("response_format", None)
+        return routed
+
+    def complete(self, payload, stage=None):
+        routes = self.routes_for(stage)
+        primary = routes[0]
+        if len(routes) > 1 and self._degraded(primary):
+            return self._hedged(payload, stage, primary, routes[1])
+
+        last_error = None
+        for route in routes:
+            try:
+                return self._call(route, payload, stage)
+            except BackendError as error:
+                last_error = error
+                self._mark_failed(route, error)
+        raise last_error
+
+    def stream(self, payload, stage=None, result=None):
+        # Failover is only possible until the first piece was produced
+        last_error = None
+        for route in self.routes_for(stage):
+            started = False
+            start = time.perf_counter()
+            try:
+                routed = self._routed(route, payload, stage)
+                for piece in self.backends[route["backend"]].stream(routed, stage=stage, result=result):
+                    started = True
+                    yield piece
+                self._record_latency(route, time.perf_counter() - start)
+                return
+            except BackendError as error:
+                if started:
+                    raise
+                last_error = error
+                self._mark_failed(route, error)
+        raise last_error
+
+    def _call(self, route, payload, stage):
+        routed = self._routed(route, payload, stage)
+        start = time.perf_counter()
+        message, usage, status, retries, _ = self.backends[route["backend"]].complete(routed, stage=stage)
+        self._record_latency(route, time.perf_counter() - start)
+        return message, usage, status, retries, routed["model"]
+
+    def _hedged(self, payload, stage, primary, backup):
+        # The primary gets max_p95 seconds head start, then the backup races it; first answer wins
+        print(f"{primary['backend']}/{primary.get('model')} is slow (p95 {self._p95(primary):.1f}s), "
+              f"hedging {stage} with {backup['backend']}/{backup.get('model')}.")
+        futures = {self.pool.submit(self._call, primary, payload, stage): primary}
+        done, _ = wait(futures, timeout=self.max_p95)
+        if not done:
+            futures[self.pool.submit(self._call, backup, payload, stage)] = backup
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except BackendError as error:
+                    last_error = error
+                    self._mark_failed(futures[future], error)
+            if not pending and backup not in futures.values():
+                # Primary failed before the backup was started
+                return self._call(backup, payload, stage)
+        raise last_error
+
+    def _key(self, route):
+        return f"{route['backend']}/{route.get('model')}"
+
+    def _record_latency(self, route, latency):
+        with self.lock:
+            self.latencies.setdefault(self._key(route), LatencyWindow()).add(latency)
+
+    def _p95(self, route):
+        with self.lock:
+            window = self.latencies.get(self._key(route))
+            return window.p95() if window else None
+
+    def _degraded(self, route):
+        if not self.max_p95:
+            return False
+        with self.lock:
+            window = self.latencies.get(self._key(route))
+            if window is None or len(window.samples) < self.min_samples:
+                return False
+            return window.p95() > self.max_p95
+
+    def _mark_failed(self, route, error):
+        print(f"Backend {route['backend']} failed ({error}), failing over.")
+        with self.lock:
+            self.failed_until[route["backend"]] = time.time() + self.cooldown
@@ -0,0 +1,109 @@
+import re
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    pass
+
+
+def parse_hunks(diff):
+    # Returns [(old_start, old_lines, new_lines)] from a unified diff. "--- "/"+++ " lines are only file
+    # headers where no hunk is open: inside a hunk (as counted by its header) they are a removed "-- ..."
+    # or an added "++ ..." line, e.g. an SQL or Lua comment
+    hunks = []
+    current = None
+    old_left = new_left = 0
+    for line in diff.splitlines():
+        match = HUNK_HEADER.match(line)
+        if match:
+            current = (int(match.group(1)), [], [])
+            hunks.append(current)
+            old_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_left = int(match.group(4)) if match.group(4) is not None else 1
+            continue
+        if line.startswith("\\ No newline"):
+            continue
+        if current is None:
+            # File headers, and text models sometimes add after the last hunk, are ignored
+            continue
+        if line.startswith("-"):
+            current[1].append(line[1:])
+            old_left -= 1
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            new_left -= 1
+        else:
+            # Context line; models sometimes drop the leading space of empty context lines
+            text = line[1:] if line.startswith(" ") else line
+            current[1].append(text)
+            current[2].append(text)
+            old_left -= 1
+            new_left -= 1
+        if old_left <= 0 and new_left <= 0:
+            # The hunk has all the lines its header counted
+            current = None
+    if not hunks:
+        raise PatchError("Diff contains no hunks")
+    return hunks
+
+
+def _find_block(lines, block, expected, normalize):
+    if not block:
+        return min(max(expected, 0), len(lines))
+    target = [normalize(line) for line in block]
+    # Search outwards from the position the hunk header claims, so line offsets are tolerated
+    for distance in range(len(lines) + 1):
+        for position in (expected - distance, expected + distance):
+            if 0 <= position <= len(lines) - len(block):
+                if [normalize(line) for line in lines[position:position + len(block)]] == target:
+                    return position
+            if distance == 0:
+                break
+    return None
+
+
+def apply_unified_diff(original, diff):
+    lines = original.splitlines()
+    offset = 0
+    for old_start, old_lines, new_lines in parse_hunks(diff):
+        expected = max(old_start - 1, 0) + offset
+        position = _find_block(lines, old_lines, expected, lambda line: line)
+        if position is None:
+            # Second try ignoring trailing whitespace and indentation differences
+            position = _find_block(lines, old_lines, expected, lambda line: line.strip())
+        if position is None:
+            raise PatchError(f"Hunk at line {old_start} does not match the file")
+        lines[position:position + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+    trailing_newline = "\n" if original.endswith("\n") or not original else ""
+    return "\n".join(lines) + trailing_newline
+
+
+def apply_edits(files, edits):
+    # files: [{"filename", "content"}]; edits: [{"filename", "action", "diff"|"content"}]
+    # Returns the new file list and the edits that could not be applied
+    result = {file_info["filename"]: file_info["content"] for file_info in files}
+    failed = []
+    for edit in edits:
+        filename = edit.get("filename")
+        action = edit.get("action", "patch" if "diff" in edit else "replace")
+        try:
+            if not filename:
+                raise PatchError("Edit without filename")
+            if action in ("create", "replace"):
+                # Structured output sends the field that does not apply to the action as null
+                content = edit.get("content") or ""
+                result[filename] = "\n".join(content) if isinstance(content, list) else content
+            elif action == "delete":
+                result.pop(filename, None)
+            elif action == "patch":
+                if filename not in result:
+                    raise PatchError(f"{filename} does not exist")
+                result[filename] = apply_unified_diff(result[filename], edit.get("diff") or "")
+            else:
+                raise PatchError(f"Unknown action {action}")
+        except PatchError as error:
+            print(f"Could not apply edit to {filename}: {error}")
+            failed.append(dict(edit, error=str(error)))
+    return [{"filename": name, "content": content} for name, content in result.items()], failed
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def save_output(filepath, content):
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        if isinstance(content, (dict, list)):
+            json.dump(content, f, ensure_ascii=False, indent=2)
+        else:
+            f.write(str(content))
+
+
+def create_input_file(filepath, placeholder):
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if not os.path.exists(filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(placeholder)
+
+
+def select_stages(stages, names=None):
+    # The named stages only (all for None); stages left out must have produced their outputs before
+    if names is None:
+        return stages
+    known = [stage.name for stage in stages]
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)} (available: {', '.join(known)})")
+    return [stage for stage in stages if stage.name in names]
+
+
+class Stage:
+    def __init__(self, name, inputs, outputs, run, version="1"):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.run = run
+        # Bump the version when a stage's prompt changes, so its old outputs count as stale
+        self.version = version
+
+
+class PipelineExecutor:
+    # The state file is the run journal of a project: per stage its status (running, done, failed),
+    # the hashes of the inputs it ran with, its outputs, timing and the error of a failed run
+    def __init__(self, state_path, max_workers=None):
+        self.state_path = state_path
+        # Independent stages (e.g. goals and environment) run concurrently
+        self.max_workers = max_workers or int(os.getenv("PIPELINE_WORKERS", "4"))
+        self.state = self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def file_hash(path):
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def input_hashes(self, stage):
+        return {os.path.normpath(path): self.file_hash(path) for path in stage.inputs}
+
+    def fingerprint(self, stage, input_hashes=None):
+        input_hashes = self.input_hashes(stage) if input_hashes is None else input_hashes
+        digest = hashlib.sha256()
+        digest.update(f"{stage.name}:{stage.version}".encode("utf-8"))
+        for path in sorted(input_hashes):
+            digest.update(f"\n{path}={input_hashes[path]}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_complete(self, stage):
+        # Finished in an earlier run and its outputs are still there; entries written before
+        # the journal had a status only exist for finished stages
+        entry = self.state.get(stage.name, {})
+        return entry.get("status", "done") == "done" and "fingerprint" in entry \
+            and all(os.path.exists(path) for path in stage.outputs)
+
+    def is_up_to_date(self, stage):
+        if not self.is_complete(stage):
+            return False
+        return self.state[stage.name]["fingerprint"] == self.fingerprint(stage)
+
+    def first_incomplete(self, stages):
+        # First stage a resumed run has to execute: not finished, or its inputs changed since
+        ordered, _ = self.order(stages)
+        return next((stage.name for stage in ordered if not self.is_up_to_date(stage)), None)
+
+    @staticmethod
+    def order(stages):
+        # Topological order: a stage depends on every stage that produces one of its inputs
+        producers = {}
+        for stage in stages:
+            for path in stage.outputs:
+                producers[os.path.normpath(path)] = stage.name
+        dependencies = {
+            stage.name: {producers[os.path.normpath(path)] for path in stage.inputs
+                         if os.path.normpath(path) in producers} - {stage.name}
+            for stage in stages
+        }
+
+        ordered = []
+        done = set()
+        remaining = list(stages)
+        while remaining:
+            ready = [stage for stage in remaining if dependencies[stage.name] <= done]
+            if not ready:
+                raise ValueError("Pipeline contains a dependency cycle: "
+                                 + ", ".join(stage.name for stage in remaining))
+            for stage in ready:
+                ordered.append(stage)
+                done.add(stage.name)
+                remaining.remove(stage)
+        return ordered, dependencies
+
+    def run(self, stages, force=False, resume=False):
+        # resume: continue an interrupted (e.g. forced) run at its first incomplete stage; stages the
+        # journal records as done are kept as long as their inputs are unchanged and none of their
+        # upstream stages has to run again
+        ordered, dependencies = self.order(stages)
+        # Inputs no stage of this run produces have to exist before anything starts
+        produced = {os.path.normpath(path) for stage in stages for path in stage.outputs}
+        for stage in ordered:
+            missing = [path for path in stage.inputs
+                       if os.path.normpath(path) not in produced and not os.path.exists(path)]
+            if missing:
+                raise FileNotFoundError(f"Stage '{stage.name}' is missing inputs: {', '.join(missing)}")
+        if resume:
+            first = self.first_incomplete(stages)
+            print(f"Resuming at stage '{first}'." if first else "All stages are complete, nothing to resume.")
+        results = {}
+        pending = list(ordered)
+        running = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while (pending and not errors) or running:
+                # Start every stage whose upstream stages are finished; nothing new after a failure
+                ready = [] if errors else [stage for stage in pending if dependencies[stage.name] <= results.keys()]
+                for stage in ready:
+                    pending.remove(stage)
+                    upstream_ran = any(results[name] == "ran" for name in dependencies[stage.name])
+                    if resume and self.is_up_to_date(stage) and not upstream_ran:
+                        print(f"Stage '{stage.name}' was completed by the previous run, skipping.")
+                        results[stage.name] = "skipped"
+                        continue
+                    if not force and not resume and self.is_up_to_date(stage):
+                        print(f"Stage '{stage.name}' is up to date, skipping.")
+                        results[stage.name] = "skipped"
+                        continue
+
+                    missing = [path for path in stage.inputs if not os.path.exists(path)]
+                    if missing:
+                        # An upstream stage did not write its output; stages already running are still
+                        # waited for and journaled before the error is raised
+                        error = FileNotFoundError(f"Stage '{stage.name}' is missing inputs: {', '.join(missing)}")
+                        self.state[stage.name] = {"status": "failed", "finished": time.time(),
+                                                  "error": f"{type(error).__name__}: {error}"}
+                        self._save_state()
+                        print(f"Stage '{stage.name}' failed: {error}")
+                        errors.append(error)
+                        break
+
+                    print(f"Running stage '{stage.name}'...")
+                    # Inputs are hashed before the run: an input edited while the stage runs makes it stale
+                    self.state[stage.name] = {"status": "running", "started": time.time(),
+                                              "inputs": self.input_hashes(stage),
+                                              "outputs": [os.path.normpath(path) for path in stage.outputs]}
+                    self._save_state()
+                    running[pool.submit(self._run_stage, stage)] = stage
+
+                if not running:
+                    # Skipped stages may have unblocked further stages
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    entry = self.state[stage.name]
+                    try:
+                        duration = future.result()
+                    except Exception as error:
+                        # Stages running in parallel are still waited for and journaled before raising
+                        entry.update(status="failed", finished=time.time(), error=f"{type(error).__name__}: {error}")
+                        self._save_state()
+                        print(f"Stage '{stage.name}' failed: {entry['error']}")
+                        errors.append(error)
+                        continue
+
+                    entry.update(status="done", fingerprint=self.fingerprint(stage, entry["inputs"]),
+                                 finished=time.time(), duration=duration)
+                    self._save_state()
+                    results[stage.name] = "ran"
+                    print(f"Stage '{stage.name}' finished in {duration:.2f}s")
+        if errors:
+            raise errors[0]
+        return results
+
+    @staticmethod
+    def _run_stage(stage):
+        start = time.perf_counter()
+        stage.run()
+        return time.perf_counter() - start
@@ -0,0 +1,47 @@
+# Prompt layout shared by all agents. Providers cache the longest prefix they have seen before
+# (OpenAI from 1024 tokens on, at a discount), so what is the same across calls comes first, in a
+# fixed order, and what changes per call comes last:
+#   role -> response format -> documents (canonical order) -> volatile sections -> task
+
+# Canonical order of the shared documents; documents with other titles follow in the given order
+DOCUMENT_ORDER = [
+    "System Goals",
+    "System Environment",
+    "Refined Goals",
+    "Environment Profile",
+    "System Specifications",
+    "System Architecture",
+    "File Manifest",
+    "Current Codebase",
+]
+
+FILES_RESPONSE_FORMAT = (
+    f"Respond in JSON format with this structure:.\n\n"
+    f"{{\n"
+    f"  \"files\": [\n"
+    f"    {{\n"
+    f"      \"filename\": \"<filename>\",\n"
+    f"      \"content\": \"<file-content>\"\n"
+    f"    }},\n"
+    f"    ...\n"
+    f"  ]\n"
+    f"}}\n\n"
+)
+
+
+def _document_rank(title):
+    return DOCUMENT_ORDER.index(title) if title in DOCUMENT_ORDER else len(DOCUMENT_ORDER)
+
+
+def build_prompt(role, task, documents=None, volatile=None, response_format=""):
+    # documents: stable inputs shared with other calls, e.g. {"System Architecture": architecture};
+    # volatile: per-call sections like feedback, kept in the given order. Empty sections are left out.
+    parts = [f"{role}\n\n"]
+    if response_format:
+        parts.append(response_format)
+    ordered = sorted((documents or {}).items(), key=lambda item: _document_rank(item[0]))
+    for title, content in ordered + list((volatile or {}).items()):
+        if content:
+            parts.append(f"{title}:\n{content}\n\n")
+    parts.append(task)
+    return "".join(parts)
@@ -0,0 +1,153 @@
+import contextlib
+import os
+import sqlite3
+import time
+
+# Queue tickets not refreshed for this long belong to a process that died while waiting
+STALE_TICKET_SECONDS = 30.0
+
+
+class SharedRateLimiter:
+    # Requests/min and tokens/min buckets kept in a SQLite file, so all pipelines on this machine
+    # (threads and processes) share the provider limits. Waiting calls queue in the same database:
+    # the smallest request goes first, so short stages are not stuck behind long code generation
+    # calls, and calls waiting longer than max_queue_age are served strictly in arrival order
+    def __init__(self, path=None, requests_per_minute=None, tokens_per_minute=None, max_queue_age=None,
+                 poll_interval=0.2):
+        self.path = path or os.getenv("LLM_RATE_LIMIT_DB", ".rate_limit.sqlite")
+        self.requests_per_minute = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) \
+            if requests_per_minute is None else requests_per_minute
+        self.tokens_per_minute = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) \
+            if tokens_per_minute is None else tokens_per_minute
+        self.max_queue_age = float(os.getenv("LLM_QUEUE_MAX_AGE", "60")) if max_queue_age is None else max_queue_age
+        self.poll_interval = poll_interval
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS queue "
+                       "(id INTEGER PRIMARY KEY AUTOINCREMENT, tokens INTEGER, enqueued REAL, seen REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value REAL)")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write of a bucket is atomic
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def _buckets(self):
+        # (name, refill rate per second, capacity) of every configured limit
+        buckets = []
+        if self.requests_per_minute > 0:
+            buckets.append(("requests", self.requests_per_minute / 60.0, self.requests_per_minute))
+        if self.tokens_per_minute > 0:
+            buckets.append(("tokens", self.tokens_per_minute / 60.0, self.tokens_per_minute))
+        return buckets
+
+    def _level(self, db, name, rate, capacity, now):
+        row = db.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        return min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+
+    def _store(self, db, name, level, now):
+        db.execute("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)", (name, level, now))
+
+    def _next_ticket(self, db, now):
+        tickets = db.execute("SELECT id, tokens, enqueued FROM queue").fetchall()
+        overdue = [ticket for ticket in tickets if now - ticket[2] >= self.max_queue_age]
+        if overdue:
+            return min(overdue)[0]
+        return min(tickets, key=lambda ticket: (ticket[1], ticket[0]))[0]
+
+    def _try_acquire(self, db, ticket, tokens, enqueued, now):
+        # Takes one request and the tokens if it is this ticket's turn; otherwise returns the seconds to wait.
+        # The ticket is written again in case another process removed it as stale while we stalled
+        db.execute("INSERT OR REPLACE INTO queue (id, tokens, enqueued, seen) VALUES (?, ?, ?, ?)",
+                   (ticket, tokens, enqueued, now))
+        db.execute("DELETE FROM queue WHERE seen < ?", (now - STALE_TICKET_SECONDS,))
+        row = db.execute("SELECT value FROM state WHERE name = 'paused_until'").fetchone()
+        if row and row[0] > now:
+            return row[0] - now
+        if self._next_ticket(db, now) != ticket:
+            return self.poll_interval
+
+        needed = {"requests": 1, "tokens": tokens}
+        levels = {name: self._level(db, name, rate, capacity, now) for name, rate, capacity in self._buckets()}
+        waits = [(needed[name] - levels[name]) / rate for name, rate, _ in self._buckets()
+                 if levels[name] < needed[name]]
+        if waits:
+            return max(waits)
+        for name, level in levels.items():
+            self._store(db, name, level - needed[name], now)
+        db.execute("DELETE FROM queue WHERE id = ?", (ticket,))
+        return None
+
+    def acquire(self, tokens):
+        if not self._buckets():
+            return
+        # A single request larger than the bucket would never fit, so cap it at the capacity
+        if self.tokens_per_minute > 0:
+            tokens = min(tokens, self.tokens_per_minute)
+        now = time.time()
+        with self._transaction() as db:
+            ticket = db.execute("INSERT INTO queue (tokens, enqueued, seen) VALUES (?, ?, ?)",
+                                (tokens, now, now)).lastrowid
+        try:
+            while True:
+                with self._transaction() as db:
+                    wait_time = self._try_acquire(db, ticket, tokens, now, time.time())
+                if wait_time is None:
+                    return
+                # Wake up regularly: a smaller request may have arrived or the queue head may have finished
+                time.sleep(min(max(wait_time, self.poll_interval), 5.0))
+        except BaseException:
+            with self._transaction() as db:
+                db.execute("DELETE FROM queue WHERE id = ?", (ticket,))
+            raise
+
+    def adjust(self, tokens):
+        # Correct an estimate once the real usage is known; the bucket may go into debt
+        if self.tokens_per_minute <= 0:
+            return
+        now = time.time()
+        with self._transaction() as db:
+            level = self._level(db, "tokens", self.tokens_per_minute / 60.0, self.tokens_per_minute, now)
+            self._store(db, "tokens", level - tokens, now)
+
+    def release(self, tokens):
+        # Give back the request and the tokens acquire took for a call the provider rejected
+        if self.tokens_per_minute > 0:
+            tokens = min(tokens, self.tokens_per_minute)
+        now = time.time()
+        refund = {"requests": 1, "tokens": tokens}
+        with self._transaction() as db:
+            for name, rate, capacity in self._buckets():
+                self._store(db, name, min(capacity, self._level(db, name, rate, capacity, now) + refund[name]), now)
+
+    def pause(self, seconds):
+        # The provider answered 429: no process may start a call before the pause is over
+        until = time.time() + seconds
+        with self._transaction() as db:
+            row = db.execute("SELECT value FROM state WHERE name = 'paused_until'").fetchone()
+            if row is None or row[0] < until:
+                db.execute("INSERT OR REPLACE INTO state (name, value) VALUES ('paused_until', ?)", (until,))
+
+
+def create_rate_limiter():
+    # Shared limiter if LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE is set, None otherwise
+    if int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) <= 0 and int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) <= 0:
+        return None
+    return SharedRateLimiter()
+
+
+def estimate_tokens(text):
+    # Rough heuristic for English text and code: about 4 characters per token
+    return max(1, len(text) // 4)
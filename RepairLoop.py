@@ -0,0 +1,70 @@
+import json
+import os
+
+from CodebaseValidator import affected_files, format_feedback, merge_reports, validate_codebase
+from ContextBuilder import load_existing_codebase
+
+
+def changed_files(before, after):
+    previous = {file_info["filename"]: file_info["content"] for file_info in before}
+    return {file_info["filename"] for file_info in after if previous.get(file_info["filename"]) != file_info["content"]}
+
+
+def repair_codebase(agent, llm_reasoner, architecture_path, specifications_path, outputs_dir, inputs_dir,
+                    max_iterations=None, token_budget=None, report=None):
+    # Validate -> synthesize feedback from the errors -> regenerate, until the codebase validates,
+    # the iteration or token budget is used up, or an iteration does not change the errors anymore
+    max_iterations = int(os.getenv("REPAIR_MAX_ITERATIONS", "3")) if max_iterations is None else max_iterations
+    token_budget = int(os.getenv("REPAIR_TOKEN_BUDGET", "200000")) if token_budget is None else token_budget
+    report_path = os.path.join(outputs_dir, 'validation_report_with_feedback.json')
+    feedback_path = os.path.join(outputs_dir, 'validation_feedback_with_feedback.txt')
+    log_path = os.path.join(outputs_dir, 'repair_log.json')
+
+    files = load_existing_codebase(outputs_dir)
+    if report is None:
+        report = validate_codebase(files)
+    first_record = len(llm_reasoner.call_stats)
+    log = []
+
+    for iteration in range(1, max_iterations + 1):
+        if report["ok"]:
+            break
+        tokens_used = sum(record["total_tokens"] for record in llm_reasoner.call_stats[first_record:])
+        if token_budget and tokens_used >= token_budget:
+            print(f"Repair stopped: token budget of {token_budget} used up ({tokens_used} tokens).")
+            break
+
+        print(f"Repair iteration {iteration}: {len(report['errors'])} errors.")
+        feedback = format_feedback(report)
+        agent.generate_codebase(architecture_path, specifications_path, outputs_dir, inputs_dir,
+                                use_existing_codebase=True, feedback=feedback)
+
+        # Only files that changed, and the files importing them, have to be checked again
+        new_files = load_existing_codebase(outputs_dir)
+        changed = changed_files(files, new_files)
+        recheck = affected_files(new_files, changed) | {error["filename"] for error in report["errors"]}
+        previous_errors = report["errors"]
+        report = merge_reports(report, validate_codebase(new_files, only=recheck))
+        files = new_files
+
+        log.append({
+            "iteration": iteration,
+            "errors_before": len(previous_errors),
+            "errors_after": len(report["errors"]),
+            "changed": sorted(changed),
+            "rechecked": sorted(recheck),
+            "tokens": sum(record["total_tokens"] for record in llm_reasoner.call_stats[first_record:]),
+        })
+        if not changed or report["errors"] == previous_errors:
+            print("Repair stopped: the last iteration did not change the errors.")
+            break
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    with open(feedback_path, 'w', encoding='utf-8') as f:
+        f.write(format_feedback(report))
+    with open(log_path, 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=2)
+    print(f"Repair finished after {len(log)} iterations: {'valid' if report['ok'] else 'still failing'}, "
+          f"{len(report['errors'])} errors left.")
+    return report
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None, max_bytes=None, max_age=None, mode=None):
+        self.cache_dir = cache_dir or os.getenv("LLM_CACHE_DIR", ".llm_cache")
+        # Default: 500 MB and 30 days
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LLM_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+        self.max_age = max_age if max_age is not None else float(os.getenv("LLM_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+        # "on" = read and write, "refresh" = ignore existing entries but store new ones, "off" = bypass,
+        # "read" = use existing entries but store nothing (dry runs)
+        self.mode = (mode or os.getenv("LLM_CACHE", "on")).lower()
+        if self.mode not in ("on", "refresh", "off", "read"):
+            raise ValueError(f"Unknown cache mode: {self.mode}")
+        # Size of the cache directory, counted by the first evict() and kept up to date by set(),
+        # so the directory is only walked again once the cache grows over max_bytes
+        self._size = None
+        self._size_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model, payload, prompt):
+        # Hash of model name, request payload and prompt; sort_keys keeps it stable across runs
+        key_source = json.dumps({"model": model, "payload": payload, "prompt": prompt},
+                                sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if self.mode not in ("on", "read"):
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, response, metadata=None):
+        if self.mode in ("off", "read"):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        entry = {"created": time.time(), "metadata": metadata or {}, "response": response}
+        # Write to a temp file first so concurrent readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._size_lock:
+            if self._size is not None:
+                self._size += size - replaced
+            over_budget = self._size is None or self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        # Drop expired entries, then the oldest ones until the cache fits into max_bytes again
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            # Down to 90%, so the next writes do not walk the directory again right away
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                total -= size
+                if total <= self.max_bytes * 0.9:
+                    break
+        with self._size_lock:
+            self._size = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,106 @@
+import glob
+import hashlib
+import os
+import random
+import re
+import threading
+
+# Input file and the refined output an agent produced for it, per kind
+KINDS = {
+    "goals": ("goals.txt", "refined_goals.txt"),
+    "environment": ("environment.txt", "refined_environment.txt"),
+}
+
+
+def shingles(text, size=5):
+    # Character n-grams of the normalized text; short inputs like "Use Python and Tkinter." still get enough
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+# Mersenne prime for the universal hash family (a * h + b) % p
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+class MinHash:
+    def __init__(self, num_perm=128, seed=1):
+        # One 64 bit hash per shingle, permuted by (a * h + b) % p with random a, b per permutation.
+        # (xor masks are cheaper but not min-wise independent and overestimate the similarity)
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+
+    def signature(self, text):
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+                  for shingle in shingles(text)]
+        # Chained bound int methods keep min(map(...)) in C
+        return [min(map(MERSENNE_PRIME.__rmod__, map(b.__add__, map(a.__mul__, hashes))))
+                for a, b in self.permutations]
+
+    @staticmethod
+    def similarity(first, second):
+        # Fraction of equal minima estimates the Jaccard similarity of the shingle sets
+        return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class SimilarityCache:
+    # Reuses (above reuse_threshold) or seeds the prompt with (above seed_threshold) the refined
+    # output of the most similar earlier project, found via MinHash over projects/*/inputs/*.txt
+    def __init__(self, projects_dir="projects", reuse_threshold=None, seed_threshold=None, num_perm=128, mode=None):
+        self.projects_dir = projects_dir
+        self.mode = (mode or os.getenv("SIMILARITY_CACHE", "on")).lower()
+        self.reuse_threshold = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.95")) \
+            if reuse_threshold is None else reuse_threshold
+        self.seed_threshold = float(os.getenv("SIMILARITY_SEED_THRESHOLD", "0.7")) \
+            if seed_threshold is None else seed_threshold
+        self.minhash = MinHash(num_perm)
+        self.index = None
+        self.lock = threading.Lock()
+
+    def build_index(self):
+        index = {kind: [] for kind in KINDS}
+        for kind, (input_name, output_name) in KINDS.items():
+            for input_path in sorted(glob.glob(os.path.join(self.projects_dir, "*", "inputs", input_name))):
+                project_dir = os.path.dirname(os.path.dirname(input_path))
+                output_path = os.path.join(project_dir, "outputs", output_name)
+                if not os.path.exists(output_path):
+                    continue
+                with open(input_path, "r", encoding="utf-8") as f:
+                    signature = self.minhash.signature(f.read())
+                index[kind].append((signature, os.path.abspath(project_dir), output_path))
+        return index
+
+    def lookup(self, kind, text, exclude_dir=None):
+        # Returns (similarity, project_dir, refined_text) of the closest earlier project, or None
+        if self.mode == "off":
+            return None
+        with self.lock:
+            if self.index is None:
+                self.index = self.build_index()
+        exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+        signature = self.minhash.signature(text)
+        best = None
+        for candidate, project_dir, output_path in self.index.get(kind, []):
+            if project_dir == exclude_dir:
+                continue
+            similarity = MinHash.similarity(signature, candidate)
+            if best is None or similarity > best[0]:
+                best = (similarity, project_dir, output_path)
+        if best is None or best[0] < min(self.reuse_threshold, self.seed_threshold):
+            return None
+        with open(best[2], "r", encoding="utf-8") as f:
+            return best[0], best[1], f.read()
+
+    def match(self, kind, text, exclude_dir=None):
+        # ("reuse" | "seed", similarity, project_dir, refined_text), or None below both thresholds
+        match = self.lookup(kind, text, exclude_dir)
+        if match is None:
+            return None
+        similarity, project_dir, refined = match
+        action = "reuse" if similarity >= self.reuse_threshold else "seed"
+        if action == "seed" and similarity < self.seed_threshold:
+            return None
+        print(f"Similarity cache: {action} refined {kind} of {os.path.basename(project_dir)} (similarity {similarity:.2f}).")
+        return action, similarity, project_dir, refined
@@ -0,0 +1,129 @@
+import json
+
+# JSON schemas of the structured responses, in the shape of OpenAI's response_format json_schema.
+# Strict mode needs every property required and no additional properties, optional fields are nullable.
+CODEBASE_SCHEMA = {
+    "name": "codebase",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "files": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {"type": "string"},
+                        "content": {"type": "string"},
+                    },
+                    "required": ["filename", "content"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["files"],
+        "additionalProperties": False,
+    },
+}
+
+MANIFEST_SCHEMA = {
+    "name": "codebase_manifest",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "files": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {"type": "string"},
+                        "purpose": {"type": "string"},
+                        "interface": {"type": "string"},
+                    },
+                    "required": ["filename", "purpose", "interface"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["files"],
+        "additionalProperties": False,
+    },
+}
+
+EDITS_SCHEMA = {
+    "name": "codebase_edits",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "edits": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "filename": {"type": "string"},
+                        "action": {"type": "string", "enum": ["patch", "create", "delete"]},
+                        "diff": {"type": ["string", "null"]},
+                        "content": {"type": ["string", "null"]},
+                    },
+                    "required": ["filename", "action", "diff", "content"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["edits"],
+        "additionalProperties": False,
+    },
+}
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def response_format(schema):
+    # Server-side enforcement: the model can only produce JSON matching the schema
+    return {"type": "json_schema", "json_schema": schema}
+
+
+def validate(data, schema, path="$"):
+    # Checks the subset of JSON schema used above (type, enum, required, properties, items) and
+    # returns the list of errors. Unknown keys are tolerated: the code only relies on known ones.
+    types = schema.get("type")
+    if types:
+        types = [types] if isinstance(types, str) else types
+        if not any(isinstance(data, JSON_TYPES[name]) and not (isinstance(data, bool) and name in ("number", "integer"))
+                   for name in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(data).__name__}"]
+    if "enum" in schema and data not in schema["enum"]:
+        return [f"{path}: {data!r} is not one of {', '.join(map(str, schema['enum']))}"]
+
+    errors = []
+    if isinstance(data, dict):
+        errors.extend(f"{path}: missing {name}" for name in schema.get("required", []) if name not in data)
+        for name, subschema in schema.get("properties", {}).items():
+            if name in data:
+                errors.extend(validate(data[name], subschema, f"{path}.{name}"))
+    elif isinstance(data, list) and "items" in schema:
+        for index, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def parse_response(text, schema):
+    # Returns (data, errors); markdown fences and text around the JSON object are ignored
+    start = text.find('{')
+    if start == -1:
+        return None, ["no JSON object in the response"]
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError as e:
+        return None, [f"invalid JSON: {e}"]
+    return data, validate(data, schema["schema"])
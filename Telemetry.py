@@ -0,0 +1,71 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# USD per 1M tokens (input, output, cached input); unknown models are reported without cost
+MODEL_PRICES = {
+    "o3-mini": (1.10, 4.40, 0.55),
+    "o4-mini": (1.10, 4.40, 0.275),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    # cached_tokens are part of prompt_tokens, billed at the cached input price
+    return ((prompt_tokens - cached_tokens) * prices[0] + completion_tokens * prices[1]
+            + cached_tokens * prices[2]) / 1_000_000
+
+
+class Telemetry:
+    # Appends one JSON line per LLM call to a trace file of the current project run
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.records = []
+        self.lock = threading.Lock()
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+
+    @classmethod
+    def for_project(cls, outputs_dir):
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return cls(os.path.join(outputs_dir, 'traces', f'run_{run_id}.jsonl'))
+
+    def record(self, stage, model, latency, retries=0, status=None, cache_hit=False, usage=None, error=None,
+               schema_errors=None):
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        # Prompt prefix served from the provider's prompt cache, see PromptBuilder
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        entry = {
+            "timestamp": time.time(),
+            "stage": stage or "unknown",
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "total_tokens": usage.get("total_tokens", prompt_tokens + completion_tokens),
+            "latency": round(latency, 4),
+            "retries": retries,
+            "status": status,
+            "cache_hit": cache_hit,
+            "cost": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+        }
+        if error:
+            entry["error"] = error
+        if schema_errors:
+            # Structured response that did not match its schema (validated locally)
+            entry["schema_errors"] = schema_errors[:5]
+
+        with self.lock:
+            self.records.append(entry)
+            if self.trace_path:
+                with open(self.trace_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
@@ -1,3 +1,6 @@
+from PromptBuilder import build_prompt
+
+
 class ArchitectureDesignAgent:
     def __init__(self, llm_reasoner, github_manager):
         self.llm = llm_reasoner
@@ -8,13 +11,14 @@ class ArchitectureDesignAgent:
         with open(specifications_file, 'r', encoding='utf-8') as f:
             specifications = f.read()
 
-        prompt = (
-            f"You are a system architect. Based on the following system specifications, "
-            f"create a high-level system architecture including component design and technology stack selection.\n\n"
-            f"System Specifications:\n{specifications}"
+        prompt = build_prompt(
+            "You are a system architect.",
+            "Based on the system specifications above, create a high-level system architecture including "
+            "component design and technology stack selection.",
+            documents={"System Specifications": specifications},
         )
 
-        architecture_design = self.llm.get_chat_response(prompt)
+        architecture_design = self.llm.get_chat_response(prompt, stage="ArchitectureDesignAgent")
 
         """
         # Read system specifications from GitHub
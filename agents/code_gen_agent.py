@@ -1,13 +1,38 @@
 import json
 import os
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from CodebasePackager import package_codebase, stream_codebase
+from CodebaseRecovery import recover_codebase
+from PromptBuilder import FILES_RESPONSE_FORMAT, build_prompt
+from StructuredOutput import CODEBASE_SCHEMA, MANIFEST_SCHEMA, parse_response
+
+
+# Input files that are archived next to the generated code
+EXTRA_INPUT_FILES = ["goals.txt", "environment.txt"]
+
+MANIFEST_RESPONSE_FORMAT = (
+    f"Respond in JSON format with this structure:.\n\n"
+    f"{{\n"
+    f"  \"files\": [\n"
+    f"    {{\n"
+    f"      \"filename\": \"<filename>\",\n"
+    f"      \"purpose\": \"<one sentence>\",\n"
+    f"      \"interface\": \"<signatures>\"\n"
+    f"    }},\n"
+    f"    ...\n"
+    f"  ]\n"
+    f"}}\n\n"
+)
+
 
 class CodeGenerationAgent:
     def __init__(self, llm_reasoner, github_manager):
         self.llm = llm_reasoner
         self.github = github_manager
 
-    def generate_codebase(self, architecture_file, specifications_file, outputs_dir, inputs_dir):
+    def generate_codebase(self, architecture_file, specifications_file, outputs_dir, inputs_dir, stream=None,
+                          per_file=None):
         # Read file locally
         with open(architecture_file, 'r', encoding='utf-8') as f:
             architecture = f.read()
@@ -20,89 +45,137 @@ class CodeGenerationAgent:
         specifications = self.github.read_file(specifications_file)
         """
 
+        txt_path = os.path.join(outputs_dir, 'generated_codebase.txt')
+        file_path = os.path.join(outputs_dir, 'generated_codebase.zip')
+
+        # CODEGEN_MODE=per_file: manifest first, then every file in its own concurrent request
+        if per_file is None:
+            per_file = os.getenv("CODEGEN_MODE", "single") == "per_file"
+
+        if per_file:
+            files = self._generate_per_file(architecture, specifications, outputs_dir)
+            codebase = json.dumps({"files": files}, ensure_ascii=False, indent=2)
+            with open(txt_path, 'w', encoding='utf-8') as f:
+                f.write(codebase)
+            codebase = package_codebase(files, file_path, inputs_dir, EXTRA_INPUT_FILES)
+            self.github.publish_codebase(file_path, codebase, "Generated Codebase")
+            return codebase
+
         # Generate codebase
-        prompt = (
-            f"You are a software engineer. Based on the following system architecture and specifications, "
-            f"generate all required Python-Files. Respond in JSON format with this structure:.\n\n"
-            f"{{\n"
-            f"  \"files\": [\n"
-            f"    {{\n"
-            f"      \"filename\": \"<filename>\",\n"
-            f"      \"content\": \"<file-content>\"\n"
-            f"    }},\n"
-            f"    ...\n"
-            f"  ]\n"
-            f"}}\n\n"
-            f"System Architecture:\n{architecture}\n\n"
-            f"System Specifications:\n{specifications}"
+        prompt = build_prompt(
+            "You are a software engineer.",
+            "Based on the system architecture and specifications above, generate all required Python-Files.",
+            documents={"System Architecture": architecture, "System Specifications": specifications},
+            response_format=FILES_RESPONSE_FORMAT,
         )
 
-        codebase = self.llm.get_chat_response(prompt)
-        """
-        codebase = self.llm.get_chat_response(
-            prompt#,
-            #response_format={ "type": "json_object" }
-        ) # Get the response in JSON format
-        """
+        if stream is None:
+            stream = os.getenv("LLM_STREAM", "0") == "1"
 
-        print(codebase)
+        if stream:
+            # Files are written into the zip as soon as the model has finished each of them
+            chunks = self.llm.stream_chat_response(prompt, stage="CodeGenerationAgent", schema=CODEBASE_SCHEMA)
+            codebase = stream_codebase(
+                chunks, txt_path, file_path, inputs_dir, EXTRA_INPUT_FILES,
+                recover=lambda files, raw: recover_codebase(self.llm, prompt, raw, "CodeGenerationAgent")[len(files):]
+            )
+        else:
+            codebase = self.llm.get_chat_response(prompt, stage="CodeGenerationAgent", schema=CODEBASE_SCHEMA)
 
-        # Save codebase
-        txt_path = os.path.join(outputs_dir, 'generated_codebase.txt')
+            print(codebase)
 
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(codebase)
+            # Save codebase
+            with open(txt_path, 'w', encoding='utf-8') as f:
+                f.write(codebase)
 
-        file_path = os.path.join(outputs_dir, 'generated_codebase.zip')
-
-        codebase = save_codebase_as_zip(txt_path, file_path, inputs_dir)
+            # Salvages a malformed or truncated response and only re-requests the missing files
+            files = recover_codebase(self.llm, prompt, codebase, "CodeGenerationAgent")
+            codebase = package_codebase(files, file_path, inputs_dir, EXTRA_INPUT_FILES)
 
         commit_message = "Generated Codebase"
         
-        try:
-            # Check if the file exists
-            existing_file = self.github.get_contents(file_path)
-            self.github.update_file(file_path, commit_message, codebase, existing_file.sha)
-        except self.github.GithubException as e:
-            if e.status == 404:
-                # File does not exist, create it
-                self.github.create_file(file_path, commit_message, codebase)
-            else:
-                raise e
+        # Uses the cached sha instead of looking the file up first
+        self.github.publish_codebase(file_path, codebase, commit_message)
 
         return codebase
 
-
-def save_codebase_as_zip(codebase_json_path, zip_path, inputs_dir):
-    # Lade das JSON aus der Datei
-    with open(codebase_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    #print(data)
-
-    # Liste der Dateien aus dem JSON auslesen
-    files = data.get("files", [])
-
-    # ZIP-Datei erstellen
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        # Durch alle Einträge im Dictionary iterieren
-        # Hier ist jeder Schlüssel ein Dateiname und jeder Wert der Dateiinhalt
-        for file_info in files:
-            filename = file_info.get("filename")
-            content = file_info.get("content")
-            if isinstance(content, list):
-                content = "\n".join(content)
-            zipf.writestr(filename, content)
-
-        # Füge extra input-Dateien hinzu, falls vorhanden
-        for extra_file in ["goals.txt", "environment.txt"]:
-            file_path = os.path.join(inputs_dir, extra_file)
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as ef:
-                    content = ef.read()
-                    zipf.writestr(os.path.join("inputs", extra_file), content)
-                # Im ZIP unter dem Ordner "inputs" ablegen
-
-    # ZIP-Datei als Bytes zurückgeben
-    with open(zip_path, 'rb') as f:
-        return f.read()
\ No newline at end of file
+    def _generate_per_file(self, architecture, specifications, outputs_dir, max_workers=None):
+        # Phase 1: the manifest is the shared contract every file is generated against
+        manifest_prompt = build_prompt(
+            "You are a software architect.",
+            "Based on the system architecture and specifications above, list all Python-Files the system needs "
+            "together with their public interface, i.e. the imports other files may use and the signatures of "
+            "their classes, methods and functions.",
+            documents={"System Architecture": architecture, "System Specifications": specifications},
+            response_format=MANIFEST_RESPONSE_FORMAT,
+        )
+        manifest_text = self.llm.get_chat_response(manifest_prompt, stage="CodeGenerationAgent.manifest",
+                                                   schema=MANIFEST_SCHEMA)
+        manifest, errors = parse_response(manifest_text, MANIFEST_SCHEMA)
+        if errors:
+            # Every file depends on the manifest, so an invalid one is requested once more
+            print(f"Codebase manifest is invalid ({errors[0]}), requesting it again.")
+            manifest_text = self.llm.get_chat_response(manifest_prompt, refresh=True,
+                                                       stage="CodeGenerationAgent.manifest", schema=MANIFEST_SCHEMA)
+            manifest, errors = parse_response(manifest_text, MANIFEST_SCHEMA)
+            if errors:
+                raise ValueError(f"Invalid codebase manifest: {'; '.join(errors[:5])}")
+        manifest = manifest["files"]
+
+        with open(os.path.join(outputs_dir, 'codebase_manifest.txt'), 'w', encoding='utf-8') as f:
+            f.write(manifest_text)
+
+        # Phase 2: all files concurrently, the slowest file bounds the wall time. Files whose request
+        # failed get one more try; a codebase with missing files is never packaged or published
+        max_workers = max_workers or int(os.getenv("CODEGEN_WORKERS", "8"))
+        manifest_json = json.dumps({"files": manifest}, ensure_ascii=False, indent=2)
+        contents = {}
+        pending = manifest
+        for attempt in range(2):
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+                futures = [
+                    (entry, pool.submit(self._generate_file, entry, manifest_json, architecture, specifications))
+                    for entry in pending
+                ]
+                failed = []
+                for entry, future in futures:
+                    try:
+                        contents[entry["filename"]] = future.result()
+                    except Exception as e:
+                        print(f"Generation of {entry['filename']} failed: {e}")
+                        failed.append(entry)
+            if not failed:
+                break
+            pending = failed
+            if attempt == 0:
+                print(f"Retrying {len(failed)} failed files.")
+
+        print(f"Generated {len(contents)} of {len(manifest)} files.")
+        if failed:
+            raise RuntimeError(f"Missing files after retry: {', '.join(entry['filename'] for entry in failed)}")
+        return [{"filename": entry["filename"], "content": contents[entry["filename"]]} for entry in manifest]
+
+    def _generate_file(self, entry, manifest_json, architecture, specifications):
+        # Everything but the task is identical for all files, so the parallel calls share one cached prefix
+        prompt = build_prompt(
+            "You are a software engineer.",
+            f"Implement the file {entry['filename']} of the system described above. "
+            f"Its purpose: {entry.get('purpose', '')}\n"
+            f"It must provide exactly this interface:\n{entry.get('interface', '')}\n\n"
+            f"Other files are generated at the same time; only use them through the interfaces listed in the "
+            f"manifest. Respond only with the content of {entry['filename']}, without markdown or explanations.",
+            documents={"System Architecture": architecture, "System Specifications": specifications,
+                       "File Manifest": manifest_json},
+        )
+        content = self.llm.get_chat_response(prompt, stage="CodeGenerationAgent.file")
+        return strip_code_fence(content)
+
+
+def strip_code_fence(text):
+    # Models sometimes wrap a single file in ```python ... ``` despite being asked not to
+    stripped = text.strip()
+    if stripped.startswith("```") and stripped.endswith("```"):
+        first_newline = stripped.find("\n")
+        if first_newline != -1:
+            return stripped[first_newline + 1:-3].rstrip() + "\n"
+    return text
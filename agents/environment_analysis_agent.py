@@ -1,16 +1,37 @@
+import os
+
+from PromptBuilder import build_prompt
+
+
 class EnvironmentAnalysisAgent:
-    def __init__(self, llm_reasoner, github_manager):
+    def __init__(self, llm_reasoner, github_manager, similarity_cache=None):
         self.llm = llm_reasoner
         self.github = github_manager
+        self.similarity_cache = similarity_cache
     
     def analyze_environment(self, env_file):
         # Read file locally
         with open(env_file, 'r', encoding='utf-8') as f:
             env_content = f.read()
 
-        prompt = f"You are a software engineer. These environmental constraints are for a software to be developed. Analyze and refine them: {env_content}"
+        # Near-identical inputs of an earlier project: reuse its refined environment, or start from it
+        match = None
+        if self.similarity_cache:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(env_file)))
+            match = self.similarity_cache.match("environment", env_content, exclude_dir=project_dir)
+        if match and match[0] == "reuse":
+            return match[3]
+        task = "These environmental constraints are for a software to be developed. Analyze and refine them."
+        if match:
+            task += (" The environmental constraints of a similar earlier project were refined as shown above. "
+                     "Use it as a starting point and adapt it where the environmental constraints differ.")
+        prompt = build_prompt(
+            "You are a software engineer.", task,
+            documents={"System Environment": env_content},
+            volatile={"Refined environment of a similar earlier project": match[3] if match else None},
+        )
 
-        env_profile = self.llm.get_chat_response(prompt)
+        env_profile = self.llm.get_chat_response(prompt, stage="EnvironmentAnalysisAgent")
 
         """
         env_content = self.github.read_file(env_file)
@@ -1,124 +1,195 @@
 import json
 import os
-import zipfile
+
+from CodebasePackager import merge_codebase_files, package_codebase
+from CodebaseRecovery import extract_codebase_files, recover_codebase
+from ContextBuilder import ContextBuilder, load_existing_codebase
+from PatchApplier import apply_edits
+from PromptBuilder import FILES_RESPONSE_FORMAT, build_prompt
+from StructuredOutput import CODEBASE_SCHEMA, EDITS_SCHEMA, parse_response
+
+
+# Input files that are archived next to the generated code
+EXTRA_INPUT_FILES = ["goals.txt", "environment.txt", "feedback.txt"]
+
+EDITS_RESPONSE_FORMAT = (
+    f"Describe only the changes as edit operations. Use \"patch\" with a unified diff (with @@ hunk headers "
+    f"and 3 lines of context) for changes to existing files, \"create\" with the full content for new files "
+    f"and \"delete\" for files that are no longer needed. Respond in JSON format with this structure:.\n\n"
+    f"{{\n"
+    f"  \"edits\": [\n"
+    f"    {{\n"
+    f"      \"filename\": \"<filename>\",\n"
+    f"      \"action\": \"patch\" | \"create\" | \"delete\",\n"
+    f"      \"diff\": \"<unified diff, for patch>\",\n"
+    f"      \"content\": \"<file-content, for create>\"\n"
+    f"    }},\n"
+    f"    ...\n"
+    f"  ]\n"
+    f"}}\n\n"
+)
 
 
 class FeedbackCodeGenerationAgent:
-    def __init__(self, llm_reasoner, github_manager):
+    def __init__(self, llm_reasoner, github_manager, context_builder=None):
         self.llm = llm_reasoner
         self.github = github_manager
+        self.context_builder = context_builder or ContextBuilder()
 
-    def generate_codebase(self, architecture_file, specifications_file, outputs_dir, inputs_dir, use_existing_codebase):
+    def generate_codebase(self, architecture_file, specifications_file, outputs_dir, inputs_dir, use_existing_codebase,
+                          compact_context=None, output_mode=None, feedback=None):
         # Read file locally
         with open(architecture_file, 'r', encoding='utf-8') as f:
             architecture = f.read()
         with open(specifications_file, 'r', encoding='utf-8') as f:
             specifications = f.read()
 
-        # Read feedback
+        # Read feedback, unless it is passed in (e.g. synthesized from validation errors)
         feedback_path = os.path.join(inputs_dir, 'feedback.txt')
-        feedback = None
-        if os.path.exists(feedback_path):
+        if feedback is not None:
+            pass
+        elif os.path.exists(feedback_path):
             with open(feedback_path, 'r', encoding='utf-8') as f:
                 feedback = f.read()
         else:
             feedback = ""
 
         # Read Codebase
-        existing_codebase = None
+        existing_files = []
         if use_existing_codebase:
-            preferred_path = os.path.join(outputs_dir, 'generated_codebase_with_feedback.txt')
-            fallback_path = os.path.join(outputs_dir, 'generated_codebase.txt')
-
-            if os.path.exists(preferred_path):
-                with open(preferred_path, 'r', encoding='utf-8') as f:
-                    existing_codebase = f.read()
-            elif os.path.exists(fallback_path):
-                with open(fallback_path, 'r', encoding='utf-8') as f:
-                    existing_codebase = f.read()
-
-        # Generate codebase
-        prompt = (
-            f"You are a software engineer. Based on the following system architecture, specifications, feedback "
-            f"and existing codebase, regenerate all required Python-Files or modify them to implement the feedback. "
-            f"Respond in JSON format with this structure:.\n\n"
-            f"{{\n"
-            f"  \"files\": [\n"
-            f"    {{\n"
-            f"      \"filename\": \"<filename>\",\n"
-            f"      \"content\": \"<file-content>\"\n"
-            f"    }},\n"
-            f"    ...\n"
-            f"  ]\n"
-            f"}}\n\n"
-            f"System Architecture:\n{architecture}\n\n"
-            f"System Specifications:\n{specifications}"
-        )
-        if feedback:
-            prompt += f"\nFeedback from previous run:\n{feedback}\n"
-        if existing_codebase:
-            prompt += f"\nCurrent Codebase:\n{existing_codebase}\n"
+            existing_files = load_existing_codebase(outputs_dir)
+
+        # Compact mode: only files relevant to the feedback in full, signatures of the rest
+        if compact_context is None:
+            compact_context = os.getenv("FEEDBACK_CONTEXT_MODE", "compact") == "compact"
+        compact_context = compact_context and bool(existing_files)
+
+        # Patch mode: the model answers with diffs/edit operations instead of complete files
+        if output_mode is None:
+            output_mode = os.getenv("FEEDBACK_OUTPUT_MODE", "files")
+        if output_mode == "patch" and not existing_files:
+            output_mode = "files"
+
+        if output_mode == "patch":
+            files = self._generate_with_edits(architecture, specifications, feedback, existing_files, compact_context)
+        else:
+            if compact_context:
+                prompt = self._build_compact_prompt(architecture, specifications, feedback, existing_files,
+                                                    FILES_RESPONSE_FORMAT)
+            else:
+                prompt = self._build_full_prompt(architecture, specifications, feedback, existing_files,
+                                                 FILES_RESPONSE_FORMAT)
+
+            codebase = self.llm.get_chat_response(prompt, stage="FeedbackCodeGenerationAgent", schema=CODEBASE_SCHEMA)
 
-        codebase = self.llm.get_chat_response(prompt)
+            print(codebase)
 
-        print(codebase)
+            # Salvages a malformed or truncated response and only re-requests the missing files
+            files = recover_codebase(self.llm, prompt, codebase, "FeedbackCodeGenerationAgent")
+
+            if compact_context:
+                # The model only returned changed files, keep the rest of the previous codebase
+                files = merge_codebase_files(existing_files, files)
 
         # Save codebase
         txt_path = os.path.join(outputs_dir, 'generated_codebase_with_feedback.txt')
 
         with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(codebase)
+            f.write(json.dumps({"files": files}, ensure_ascii=False, indent=2))
 
         file_path = os.path.join(outputs_dir, 'generated_codebase_with_feedback.zip')
 
-        codebase = save_codebase_as_zip(txt_path, file_path, inputs_dir)
+        codebase = package_codebase(files, file_path, inputs_dir, EXTRA_INPUT_FILES)
 
         commit_message = "Generated Codebase"
 
-        try:
-            # Check if the file exists
-            existing_file = self.github.get_contents(file_path)
-            self.github.update_file(file_path, commit_message, codebase, existing_file.sha)
-        except self.github.GithubException as e:
-            if e.status == 404:
-                # File does not exist, create it
-                self.github.create_file(file_path, commit_message, codebase)
-            else:
-                raise e
+        # Uses the cached sha instead of looking the file up first
+        self.github.publish_codebase(file_path, codebase, commit_message)
 
         return codebase
 
+    def _generate_with_edits(self, architecture, specifications, feedback, existing_files, compact_context):
+        if compact_context:
+            prompt = self._build_compact_prompt(architecture, specifications, feedback, existing_files,
+                                                EDITS_RESPONSE_FORMAT, patch=True)
+        else:
+            prompt = self._build_full_prompt(architecture, specifications, feedback, existing_files,
+                                             EDITS_RESPONSE_FORMAT)
+
+        response = self.llm.get_chat_response(prompt, stage="FeedbackCodeGenerationAgent", schema=EDITS_SCHEMA)
+        print(response)
+
+        # Tolerates markdown fences and text around the JSON object; edits that violate the schema are
+        # requested once more, like the manifest of per-file generation
+        edits, errors = parse_response(response, EDITS_SCHEMA)
+        if errors:
+            print(f"Edits response is invalid ({errors[0]}), requesting it again.")
+            response = self.llm.get_chat_response(prompt, refresh=True, stage="FeedbackCodeGenerationAgent",
+                                                  schema=EDITS_SCHEMA)
+            edits, errors = parse_response(response, EDITS_SCHEMA)
+            if errors:
+                raise ValueError(f"Invalid edits response: {'; '.join(errors[:5])}")
+        edits = edits["edits"]
+        files, failed = apply_edits(existing_files, edits)
+        print(f"Applied {len(edits) - len(failed)} of {len(edits)} edits.")
+        if not failed:
+            return files
+
+        # Diffs that don't apply cleanly: ask for the complete content of just these files
+        failed_names = sorted({edit["filename"] for edit in failed if edit.get("filename")})
+        current = {file_info["filename"]: file_info["content"] for file_info in files}
+        failed_files = [{"filename": name, "content": current.get(name, "")} for name in failed_names]
+        repair_prompt = build_prompt(
+            "You are a software engineer.",
+            f"The edits above could not be applied to the codebase. Return the complete new content of the "
+            f"files {', '.join(failed_names)} with the intended changes applied.",
+            volatile={
+                "Feedback to implement": feedback,
+                "Current content of these files": json.dumps({"files": failed_files}, ensure_ascii=False, indent=2),
+                "Edits that failed": json.dumps(failed, ensure_ascii=False, indent=2),
+            },
+            response_format=FILES_RESPONSE_FORMAT,
+        )
+        repaired = self.llm.get_chat_response(repair_prompt, stage="FeedbackCodeGenerationAgent",
+                                              schema=CODEBASE_SCHEMA)
+        return merge_codebase_files(files, extract_codebase_files(repaired)[0])
+
+    def _build_full_prompt(self, architecture, specifications, feedback, existing_files, response_format):
+        existing_codebase = json.dumps({"files": existing_files}, ensure_ascii=False, indent=2) \
+            if existing_files else None
+        return build_prompt(
+            "You are a software engineer.",
+            "Based on the system architecture, specifications, existing codebase and feedback above, regenerate "
+            "all required Python-Files or modify them to implement the feedback.",
+            documents={"System Architecture": architecture, "System Specifications": specifications,
+                       "Current Codebase": existing_codebase},
+            volatile={"Feedback from previous run": feedback},
+            response_format=response_format,
+        )
 
-def save_codebase_as_zip(codebase_json_path, zip_path, inputs_dir):
-    # Lade das JSON aus der Datei
-    with open(codebase_json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # print(data)
-
-    # Liste der Dateien aus dem JSON auslesen
-    files = data.get("files", [])
-
-    # ZIP-Datei erstellen
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        # Durch alle Einträge im Dictionary iterieren
-        # Hier ist jeder Schlüssel ein Dateiname und jeder Wert der Dateiinhalt
-        for file_info in files:
-            filename = file_info.get("filename")
-            content = file_info.get("content")
-            if isinstance(content, list):
-                content = "\n".join(content)
-            zipf.writestr(filename, content)
-
-        # Füge extra input-Dateien hinzu, falls vorhanden
-        for extra_file in ["goals.txt", "environment.txt", "feedback.txt"]:
-            file_path = os.path.join(inputs_dir, extra_file)
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as ef:
-                    content = ef.read()
-                    zipf.writestr(os.path.join("inputs", extra_file), content)
-                # Im ZIP unter dem Ordner "inputs" ablegen
-
-    # ZIP-Datei als Bytes zurückgeben
-    with open(zip_path, 'rb') as f:
-        return f.read()
\ No newline at end of file
+    def _build_compact_prompt(self, architecture, specifications, feedback, existing_files, response_format,
+                              patch=False):
+        sections = self.context_builder.build(architecture, specifications, feedback, existing_files)
+        task = ("Based on the system architecture, specifications, existing codebase and feedback above, modify or "
+                "add Python-Files to implement the feedback. ")
+        if patch:
+            # A diff needs the current lines, which only the files shown in full provide
+            task += ("Use \"patch\" only for files shown with their full content; to change a file shown with "
+                     "signatures only, use \"create\" with its complete new content. Files without an edit are "
+                     "kept unchanged.")
+        else:
+            task += ("Return only the files you create or modify, each with its complete new content. "
+                     "Files you do not return are kept unchanged.")
+        # Which files are shown in full depends on the feedback, so the codebase is volatile here
+        return build_prompt(
+            "You are a software engineer.",
+            task,
+            documents={"System Architecture": sections["architecture"],
+                       "System Specifications": sections["specifications"]},
+            volatile={
+                "Other files of the current codebase (signatures only)": sections["other_files"],
+                "Files relevant to the feedback (full content)": sections["relevant_files"],
+                "Feedback from previous run": sections["feedback"],
+            },
+            response_format=response_format,
+        )
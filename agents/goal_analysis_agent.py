@@ -1,19 +1,38 @@
 import json
+import os
+
+from PromptBuilder import build_prompt
 
 
 class GoalAnalysisAgent:
-    def __init__(self, llm_reasoner, github_manager):
+    def __init__(self, llm_reasoner, github_manager, similarity_cache=None):
         self.llm = llm_reasoner
         self.github = github_manager
+        self.similarity_cache = similarity_cache
     
     def process_goals(self, goals_file):
         # Read file locally
         with open(goals_file, 'r', encoding='utf-8') as f:
             goals_content = f.read()
 
-        prompt = f"You are a requirements engineer. These are goals of a future software, analyze and refine them: {goals_content}"
+        # Near-identical inputs of an earlier project: reuse its refined goals, or start from it
+        match = None
+        if self.similarity_cache:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(goals_file)))
+            match = self.similarity_cache.match("goals", goals_content, exclude_dir=project_dir)
+        if match and match[0] == "reuse":
+            return match[3]
+        task = "These are goals of a future software, analyze and refine them."
+        if match:
+            task += (" The goals of a similar earlier project were refined as shown above. "
+                     "Use it as a starting point and adapt it where the goals differ.")
+        prompt = build_prompt(
+            "You are a requirements engineer.", task,
+            documents={"System Goals": goals_content},
+            volatile={"Refined goals of a similar earlier project": match[3] if match else None},
+        )
 
-        refined_goals = self.llm.get_chat_response(prompt)
+        refined_goals = self.llm.get_chat_response(prompt, stage="GoalAnalysisAgent")
 
         """
         goals_content = self.github.read_file(goals_file)
@@ -1,3 +1,6 @@
+from PromptBuilder import build_prompt
+
+
 class SpecificationGenerationAgent:
     def __init__(self, llm_reasoner, github_manager):
         self.llm = llm_reasoner
@@ -10,15 +13,14 @@ class SpecificationGenerationAgent:
         with open(env_file, 'r', encoding='utf-8') as f:
             env_profile = f.read()
 
-        prompt = (
-            f"You are a software engineer. Based on the following refined goals and environment profile, "
-            f"generate detailed system specifications including functional requirements, non-functional requirements, "
-            f"and system design recommendations.\n\n"
-            f"Refined Goals:\n{refined_goals}\n\n"
-            f"Environment Profile:\n{env_profile}"
+        prompt = build_prompt(
+            "You are a software engineer.",
+            "Based on the refined goals and environment profile above, generate detailed system specifications "
+            "including functional requirements, non-functional requirements, and system design recommendations.",
+            documents={"Refined Goals": refined_goals, "Environment Profile": env_profile},
         )
 
-        specifications = self.llm.get_chat_response(prompt)
+        specifications = self.llm.get_chat_response(prompt, stage="SpecificationGenerationAgent")
 
         """
         # Read refined goals and environment profile from GitHub
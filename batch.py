@@ -0,0 +1,147 @@
+from LLMReasoner import LLMReasoner
+from GitHubManager import GitHubManager
+from RateLimiter import SharedRateLimiter
+import argparse
+import functools
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import main
+import feedback
+import single_agent
+
+# Pipeline entry point per mode; each exposes run_project(base_dir, llm_reasoner, github_manager, force, resume)
+RUNNERS = {
+    'multi': main.run_project,
+    'single': single_agent.run_project,
+    'feedback': feedback.run_project,
+    'repair': functools.partial(feedback.run_project, auto_repair=True),
+}
+
+
+def resolve_projects(patterns):
+    # Accepts project directories as well as globs like projects/python_notes_App_*
+    projects = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(os.path.join(path, 'inputs')) and path not in projects:
+                projects.append(path)
+            elif not glob.has_magic(pattern):
+                print(f"Skipping {path}: no inputs directory found.")
+    return projects
+
+
+def load_journal(journal_path, mode):
+    # Projects the journaled batch already finished in this mode, {project: record}
+    finished = {}
+    if not os.path.exists(journal_path):
+        return finished
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Last line of a batch that was killed while writing it
+                continue
+            if record.get("mode") == mode and record.get("status") == "ok":
+                finished[record["project"]] = record
+    return finished
+
+
+def run_batch(projects, runner, llm_reasoner, github_manager, concurrency, force=False, resume=False,
+              journal_path=None, mode=None):
+    # Every finished project is appended to the journal right away, so an interrupted batch can be
+    # resumed: projects that finished are skipped, the others continue at their first incomplete stage
+    records = []
+    finished = load_journal(journal_path, mode) if resume and journal_path else {}
+    if journal_path and not resume:
+        open(journal_path, 'w', encoding='utf-8').close()
+    journal_lock = threading.Lock()
+
+    def run_one(base_dir):
+        start = time.perf_counter()
+        record = {"project": base_dir, "mode": mode, "started": time.time()}
+        try:
+            record["stages"] = runner(base_dir, llm_reasoner, github_manager, force=force, resume=resume)
+            record["status"] = "ok"
+        except Exception as error:
+            record["status"] = "failed"
+            record["error"] = f"{type(error).__name__}: {error}"
+            record["traceback"] = traceback.format_exc()
+            print(f"Project {base_dir} failed: {record['error']}")
+        record["duration"] = time.perf_counter() - start
+        if journal_path:
+            with journal_lock, open(journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    for base_dir in projects:
+        if base_dir in finished:
+            print(f"Project {base_dir} was finished by the previous batch, skipping.")
+            records.append(dict(finished[base_dir], resumed=True))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(run_one, base_dir) for base_dir in projects if base_dir not in finished]
+        for future in as_completed(futures):
+            record = future.result()
+            print(f"Project {record['project']}: {record['status']} in {record['duration']:.1f}s")
+            records.append(record)
+
+    return sorted(records, key=lambda record: projects.index(record["project"]))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run the agent pipeline for many projects in parallel.")
+    parser.add_argument('projects', nargs='+', help="Project directories or globs, e.g. 'projects/python_notes_App_*'")
+    parser.add_argument('--mode', choices=sorted(RUNNERS), default='multi')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('BATCH_CONCURRENCY', '3')))
+    parser.add_argument('--tokens-per-minute', type=int, default=int(os.getenv('LLM_TOKENS_PER_MINUTE', '0')),
+                        help="Token budget shared by all projects and processes (0 = unlimited)")
+    parser.add_argument('--requests-per-minute', type=int, default=int(os.getenv('LLM_REQUESTS_PER_MINUTE', '0')),
+                        help="Request budget shared by all projects and processes (0 = unlimited)")
+    parser.add_argument('--report', default='batch_report.json')
+    parser.add_argument('--force', action='store_true', help="Re-run stages even if they are up to date")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted batch: skip finished projects, resume the others")
+    parser.add_argument('--journal', default='batch_journal.jsonl', help="Per-project journal used by --resume")
+    args = parser.parse_args()
+
+    projects = resolve_projects(args.projects)
+    if not projects:
+        parser.error("No project directories matched.")
+
+    rate_limiter = None
+    if args.tokens_per_minute > 0 or args.requests_per_minute > 0:
+        # Kept in LLM_RATE_LIMIT_DB, so concurrent batch runs and pipelines share the budget as well
+        rate_limiter = SharedRateLimiter(requests_per_minute=args.requests_per_minute,
+                                         tokens_per_minute=args.tokens_per_minute)
+    # One reasoner for all projects, so they share the connection pool, cache and rate limits
+    llm_reasoner = LLMReasoner(rate_limiter=rate_limiter)
+    github_manager = GitHubManager(os.getenv('GITHUB_TOKEN'), 'LLM_Software_Company')
+
+    start = time.perf_counter()
+    records = run_batch(projects, RUNNERS[args.mode], llm_reasoner, github_manager, args.concurrency, args.force,
+                        resume=args.resume, journal_path=args.journal, mode=args.mode)
+    report = {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "tokens_per_minute": args.tokens_per_minute,
+        "requests_per_minute": args.requests_per_minute,
+        "duration": time.perf_counter() - start,
+        "succeeded": sum(record["status"] == "ok" for record in records),
+        "failed": sum(record["status"] != "ok" for record in records),
+        "projects": records,
+    }
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Batch finished: {report['succeeded']} succeeded, {report['failed']} failed. Report: {args.report}")
+
+
+if __name__ == "__main__":
+    main_cli()
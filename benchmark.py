@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from FakeGitHub import FakeGithub
+from GitHubManager import GitHubManager
+from LLMBackends import ReplayBackend
+from LLMReasoner import LLMReasoner
+from ResponseCache import ResponseCache
+from batch import RUNNERS, resolve_projects
+
+DEFAULT_PROJECTS = [os.path.join('projects', 'python_*')]
+DEFAULT_MODES = ['multi', 'single', 'feedback']
+# Metrics that are compared against a baseline; stage durations are compared as well
+COMPARED_METRICS = ['wall_time', 'peak_memory', 'bytes_written']
+IGNORED_FILES = shutil.ignore_patterns('traces', '.pipeline_state.json', '__pycache__')
+
+
+def snapshot(path):
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            files[os.path.join(root, name)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def bytes_written(before, after):
+    # Size of every file the run created or rewrote
+    return sum(size for path, (mtime, size) in after.items() if before.get(path, (None,))[0] != mtime)
+
+
+def prepare_workspace(source_dir, mode, workspace):
+    # Fresh copy per run: multi/single start from the inputs only, feedback needs the previous outputs
+    target = os.path.join(workspace, os.path.basename(os.path.normpath(source_dir)))
+    shutil.copytree(os.path.join(source_dir, 'inputs'), os.path.join(target, 'inputs'))
+    if mode in ('feedback', 'repair'):
+        shutil.copytree(os.path.join(source_dir, 'outputs'), os.path.join(target, 'outputs'), ignore=IGNORED_FILES)
+    return target
+
+
+def can_run(source_dir, mode):
+    if mode in ('feedback', 'repair'):
+        outputs_dir = os.path.join(source_dir, 'outputs')
+        return all(os.path.exists(os.path.join(outputs_dir, name))
+                   for name in ('refined_goals.txt', 'refined_environment.txt'))
+    return os.path.exists(os.path.join(source_dir, 'inputs', 'goals.txt'))
+
+
+def run_case(source_dir, mode, latency, tokens_per_second, trace_memory, verbose):
+    projects_dir = os.path.dirname(os.path.normpath(source_dir))
+    backend = ReplayBackend(projects_dir, latency=latency, tokens_per_second=tokens_per_second,
+                            project=os.path.basename(os.path.normpath(source_dir)))
+    llm_reasoner = LLMReasoner(backend=backend, cache=ResponseCache(mode='off'))
+    github = FakeGithub(login='benchmark')
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as workspace:
+        base_dir = prepare_workspace(source_dir, mode, workspace)
+        files_before = snapshot(base_dir)
+
+        if trace_memory:
+            tracemalloc.start()
+        output = io.StringIO()
+        start = time.perf_counter()
+        error = None
+        try:
+            with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                github_manager = GitHubManager('benchmark', 'LLM_Software_Company', github=github,
+                                               sha_cache_path=os.path.join(workspace, 'sha_cache.json'))
+                stages = RUNNERS[mode](base_dir, llm_reasoner, github_manager, force=True)
+        except Exception as e:
+            stages = {}
+            error = f"{type(e).__name__}: {e}"
+        wall_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+
+        outputs_dir = os.path.join(base_dir, 'outputs_single' if mode == 'single' else 'outputs')
+        state = {}
+        state_path = os.path.join(outputs_dir, '.pipeline_state.json')
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        zip_sizes = {name: os.path.getsize(os.path.join(outputs_dir, name))
+                     for name in sorted(os.listdir(outputs_dir)) if name.endswith('.zip')} \
+            if os.path.isdir(outputs_dir) else {}
+        # A run that failed before its first upload never created the repository
+        repo = github.get_user().repos.get('LLM_Software_Company')
+
+        return {
+            "project": os.path.basename(os.path.normpath(source_dir)),
+            "mode": mode,
+            "status": "failed" if error else "ok",
+            "error": error,
+            "wall_time": round(wall_time, 4),
+            "stages": {name: round(entry.get("duration", 0.0), 4) for name, entry in state.items()},
+            "stage_results": stages,
+            "peak_memory": peak_memory,
+            "bytes_written": bytes_written(files_before, snapshot(base_dir)),
+            "zip_sizes": zip_sizes,
+            "llm_calls": len(llm_reasoner.call_stats),
+            "llm_tokens": sum(record["total_tokens"] for record in llm_reasoner.call_stats),
+            "github_calls": dict(repo.calls) if repo else {},
+        }
+
+
+def compare(results, baseline, threshold, min_delta):
+    # A metric regresses when it grew by more than threshold (relative) and min_delta (absolute,
+    # seconds for times; bytes are compared relatively only)
+    previous = {(entry["project"], entry["mode"]): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry["project"], entry["mode"]))
+        if not old or entry["status"] != "ok" or old.get("status") != "ok":
+            continue
+        pairs = [(metric, old.get(metric), entry.get(metric)) for metric in COMPARED_METRICS]
+        pairs += [(f"stages.{name}", old.get("stages", {}).get(name), value)
+                  for name, value in entry["stages"].items()]
+        for metric, before, after in pairs:
+            if not before or after is None:
+                continue
+            is_time = metric == 'wall_time' or metric.startswith('stages.')
+            if after > before * (1 + threshold) and (not is_time or after - before > min_delta):
+                regressions.append({"project": entry["project"], "mode": entry["mode"], "metric": metric,
+                                    "baseline": before, "current": after,
+                                    "change": round(after / before - 1, 4)})
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipelines offline (replayed LLM, fake GitHub).")
+    parser.add_argument('projects', nargs='*', default=DEFAULT_PROJECTS,
+                        help="Project directories or globs with recorded outputs (default: projects/python_*)")
+    parser.add_argument('--modes', default=','.join(DEFAULT_MODES),
+                        help=f"Comma separated pipelines to run: {', '.join(sorted(RUNNERS))}")
+    parser.add_argument('--latency', type=float, default=float(os.getenv('REPLAY_LATENCY', '0')),
+                        help="Synthetic seconds per LLM call")
+    parser.add_argument('--tokens-per-second', type=float, default=float(os.getenv('REPLAY_TOKENS_PER_SECOND', '0')),
+                        help="Synthetic generation speed (0 = instant)")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the fastest one is reported")
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc (it slows the runs down)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="Earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative growth per metric")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="Ignore time regressions below these seconds")
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline output")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in RUNNERS]
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(unknown)}")
+    projects = resolve_projects(args.projects)
+    if not projects:
+        parser.error("No project directories matched.")
+
+    results = []
+    for source_dir in projects:
+        for mode in modes:
+            if not can_run(source_dir, mode):
+                continue
+            runs = [run_case(source_dir, mode, args.latency, args.tokens_per_second, not args.no_memory, args.verbose)
+                    for _ in range(max(1, args.repeat))]
+            result = min(runs, key=lambda run: run["wall_time"])
+            results.append(result)
+            memory = f"{result['peak_memory'] / 1e6:7.1f} MB" if result['peak_memory'] is not None else "      -"
+            print(f"{result['project'][:45]:45} {mode:9} {result['status']:6} {result['wall_time']:8.3f}s "
+                  f"{memory} {result['bytes_written'] / 1e3:9.1f} kB written")
+            if result["error"]:
+                print(f"  {result['error']}")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "config": {"modes": modes, "latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                   "repeat": args.repeat, "memory": not args.no_memory},
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline.get("revision")
+        report["regressions"] = compare(results, baseline, args.threshold, args.min_delta)
+        for regression in report["regressions"]:
+            print(f"Regression {regression['project']} {regression['mode']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} (+{regression['change']:.0%})")
+        if report["regressions"]:
+            exit_code = 1
+        else:
+            print(f"No regressions against {args.baseline}.")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,78 @@
-from LLMReasoner import LLMReasoner
-from GitHubManager import GitHubManager
+from CodebaseValidator import run_validation
+from PipelineExecutor import PipelineExecutor, Stage, select_stages
+from RepairLoop import repair_codebase
+from Telemetry import Telemetry
+import json
 import os
 
 from agents.feedback_code_gen_agent import FeedbackCodeGenerationAgent
 
-def save_output(filepath, content):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        if isinstance(content, (dict, list)):
-            import json
-            json.dump(content, f, ensure_ascii=False, indent=2)
-        else:
-            f.write(str(content))
-
-def create_input_file(filepath, placeholder):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    if not os.path.exists(filepath):
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(placeholder)
+OUTPUTS_DIR = 'outputs'
+STAGES = ['feedback', 'validate_feedback']
 
-def main():
-    # Define project structure
-    project_name = 'python_notes_App_4_Features_openAi_o3_mini'
-    base_dir = os.path.join('projects', project_name)
+def build_pipeline(code_gen_agent, inputs_dir, outputs_dir):
+    architecture_path = os.path.join(outputs_dir, 'refined_goals.txt')
+    specifications_path = os.path.join(outputs_dir, 'refined_environment.txt')
+    # Without feedback.txt the agent works with empty feedback (auto-repair writes its own)
+    feedback_path = os.path.join(inputs_dir, 'feedback.txt')
+    feedback_paths = [feedback_path] if os.path.exists(feedback_path) else []
+    # The codebase the feedback is applied to: a regenerated one makes the feedback run stale
+    codebase_paths = [path for path in (os.path.join(outputs_dir, 'generated_codebase.txt'),
+                                        os.path.join(outputs_dir, 'generated_codebase.zip'))
+                      if os.path.exists(path)]
+
+    # Feedback-Agent: Feedback.txt wird automatisch berücksichtigt
+    # The agent writes generated_codebase_with_feedback.txt (raw JSON) and the zip itself
+    def run_feedback():
+        code_gen_agent.generate_codebase(architecture_path, specifications_path, outputs_dir, inputs_dir, use_existing_codebase=True)
+
+    codebase_zip_path = os.path.join(outputs_dir, 'generated_codebase_with_feedback.zip')
+    validation_report_path = os.path.join(outputs_dir, 'validation_report_with_feedback.json')
+    validation_feedback_path = os.path.join(outputs_dir, 'validation_feedback_with_feedback.txt')
+
+    def run_validate():
+        run_validation(codebase_zip_path, validation_report_path, validation_feedback_path)
+
+    # Only re-run when feedback.txt, the refined documents or the codebase changed since the last feedback run
+    return [
+        Stage('feedback', [architecture_path, specifications_path] + feedback_paths + codebase_paths,
+              [os.path.join(outputs_dir, 'generated_codebase_with_feedback.txt'), codebase_zip_path],
+              run_feedback),
+        Stage('validate_feedback', [codebase_zip_path], [validation_report_path, validation_feedback_path],
+              run_validate),
+    ]
+
+def run_project(base_dir, llm_reasoner, github_manager, force=False, auto_repair=False, resume=False, stages=None,
+                repair_iterations=None):
     inputs_dir = os.path.join(base_dir, 'inputs')
-    outputs_dir = os.path.join(base_dir, 'outputs')
+    outputs_dir = os.path.join(base_dir, OUTPUTS_DIR)
 
-    # Initialize components
-    llm_reasoner = LLMReasoner()
-    # Initialize GitHub manager with a personal access token and repository name
-    # These are from the newly created GitHub repository that will be used to store the generated code
-    github_manager = GitHubManager(os.getenv('GITHUB_TOKEN'), 'LLM_Software_Company')
+    # Trace every LLM call of this run to <outputs>/traces/run_<timestamp>.jsonl
+    llm_reasoner = llm_reasoner.with_telemetry(Telemetry.for_project(outputs_dir))
 
     # Generate Codebase
     code_gen_agent = FeedbackCodeGenerationAgent(llm_reasoner, github_manager)
-    architecture_path = os.path.join(outputs_dir, 'refined_goals.txt')
-    specifications_path = os.path.join(outputs_dir, 'refined_environment.txt')
+    pipeline = select_stages(build_pipeline(code_gen_agent, inputs_dir, outputs_dir), stages)
+    executor = PipelineExecutor(os.path.join(outputs_dir, '.pipeline_state.json'))
+    results = executor.run(pipeline, force=force, resume=resume)
 
-    # Feedback-Agent: Feedback.txt wird automatisch berücksichtigt
-    codebase = code_gen_agent.generate_codebase(architecture_path, specifications_path, outputs_dir, inputs_dir, use_existing_codebase=True)
-    save_output(os.path.join(outputs_dir, 'generated_codebase_with_feedback.txt'), codebase)
+    # Auto-repair: feed validation errors back to the agent until the codebase validates
+    # (repair_iterations rounds, default REPAIR_MAX_ITERATIONS)
+    if auto_repair:
+        architecture_path = os.path.join(outputs_dir, 'refined_goals.txt')
+        specifications_path = os.path.join(outputs_dir, 'refined_environment.txt')
+        with open(os.path.join(outputs_dir, 'validation_report_with_feedback.json'), 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        report = repair_codebase(code_gen_agent, llm_reasoner, architecture_path, specifications_path,
+                                 outputs_dir, inputs_dir, max_iterations=repair_iterations, report=report)
+        results['repair'] = 'valid' if report['ok'] else 'failing'
+    return results
+
+def main():
+    # Kept for existing scripts: same as python main.py --mode feedback; --auto-repair runs
+    # REPAIR_MAX_ITERATIONS repair rounds like --feedback-iterations
+    import main as cli
+    cli.main(mode='feedback')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,20 @@
 from LLMReasoner import LLMReasoner
 from GitHubManager import GitHubManager
+from CodebaseValidator import run_validation
+from PipelineExecutor import PipelineExecutor, Stage, save_output, select_stages
+from SimilarityCache import SimilarityCache
+from Telemetry import Telemetry
+import argparse
+import contextlib
+import glob
+import io
+import json
 import os
+import shutil
+import tempfile
+
+import feedback
+import single_agent
 
 from agents.goal_analysis_agent import GoalAnalysisAgent
 from agents.environment_analysis_agent import EnvironmentAnalysisAgent
@@ -8,79 +22,212 @@ from agents.spec_gen_agent import SpecificationGenerationAgent
 from agents.architecture_design_agent import ArchitectureDesignAgent
 from agents.code_gen_agent import CodeGenerationAgent
 
-def save_output(filepath, content):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        if isinstance(content, (dict, list)):
-            import json
-            json.dump(content, f, ensure_ascii=False, indent=2)
-        else:
-            f.write(str(content))
-
-def create_input_file(filepath, placeholder):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    if not os.path.exists(filepath):
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(placeholder)
-
-def main():
-    # Define project structure
-    project_name = 'python_notes_App_4_Features_openAi_o3_mini'
-    base_dir = os.path.join('projects', project_name)
-    inputs_dir = os.path.join(base_dir, 'inputs')
-    outputs_dir = os.path.join(base_dir, 'outputs')
+DEFAULT_PROJECT = 'python_notes_App_4_Features_openAi_o3_mini'
+OUTPUTS_DIR = 'outputs'
+STAGES = ['goals', 'environment', 'specifications', 'architecture', 'codegen', 'validate']
 
-    """
-    # Create directories if they don't exist
+def build_pipeline(llm_reasoner, github_manager, inputs_dir, outputs_dir, similarity_cache=None):
     goals_path = os.path.join(inputs_dir, 'goals.txt')
     env_path = os.path.join(inputs_dir, 'environment.txt')
-    create_input_file(goals_path, f"Code a simple a lightweight news reader that fetches and displays top headlines from a public API. \n"
-                                  f"The result should be a functional application with, so if necessary, create required config files. \n"
-                                  f"Features: Basic UI: List of news headlines on the home screen Tappable item to view full article details. \n")
-    create_input_file(env_path, "The system must be secure and provide a reasonable performance. "
-                                "Technology stack: Use Python and Tkinter.")
-    """
-
-    # Initialize components
-    llm_reasoner = LLMReasoner()
-    # Initialize GitHub manager with a personal access token and repository name
-    # These are from the newly created GitHub repository that will be used to store the generated code
-    github_manager = GitHubManager(os.getenv('GITHUB_TOKEN'), 'LLM_Software_Company')
+    refined_goals_path = os.path.join(outputs_dir, 'refined_goals.txt')
+    refined_env_path = os.path.join(outputs_dir, 'refined_environment.txt')
+    specifications_path = os.path.join(outputs_dir, 'system_specifications.txt')
+    architecture_path = os.path.join(outputs_dir, 'system_architecture.txt')
+    codebase_path = os.path.join(outputs_dir, 'generated_codebase.txt')
+    codebase_zip_path = os.path.join(outputs_dir, 'generated_codebase.zip')
+    validation_report_path = os.path.join(outputs_dir, 'validation_report.json')
+    validation_feedback_path = os.path.join(outputs_dir, 'validation_feedback.txt')
 
-    # Agent Pipeline
-    goal_agent = GoalAnalysisAgent(llm_reasoner, github_manager)
-    goals_path = os.path.join(inputs_dir, 'goals.txt')
-    refined_goals = goal_agent.process_goals(goals_path)
-    #print("Refined Goals:", refined_goals)
-    save_output(os.path.join(outputs_dir, 'refined_goals.txt'), refined_goals)
+    def run_goals():
+        goal_agent = GoalAnalysisAgent(llm_reasoner, github_manager, similarity_cache)
+        refined_goals = goal_agent.process_goals(goals_path)
+        #print("Refined Goals:", refined_goals)
+        save_output(refined_goals_path, refined_goals)
 
-    env_agent = EnvironmentAnalysisAgent(llm_reasoner, github_manager)
-    env_path = os.path.join(inputs_dir, 'environment.txt')
-    env_profile = env_agent.analyze_environment(env_path)
-    #print("Environment Profile:", env_profile)
-    save_output(os.path.join(outputs_dir, 'refined_environment.txt'), env_profile)
+    def run_environment():
+        env_agent = EnvironmentAnalysisAgent(llm_reasoner, github_manager, similarity_cache)
+        env_profile = env_agent.analyze_environment(env_path)
+        #print("Environment Profile:", env_profile)
+        save_output(refined_env_path, env_profile)
 
     # Generate System Specifications
-    spec_gen_agent = SpecificationGenerationAgent(llm_reasoner, github_manager)
-    refined_goals_path = os.path.join(outputs_dir, 'refined_goals.txt')
-    refined_env_path = os.path.join(outputs_dir, 'refined_environment.txt')
-    specifications = spec_gen_agent.generate_specifications(refined_goals_path, refined_env_path)
-    #print("System Specifications:", specifications)
-    save_output(os.path.join(outputs_dir, 'system_specifications.txt'), specifications)
+    def run_specifications():
+        spec_gen_agent = SpecificationGenerationAgent(llm_reasoner, github_manager)
+        specifications = spec_gen_agent.generate_specifications(refined_goals_path, refined_env_path)
+        #print("System Specifications:", specifications)
+        save_output(specifications_path, specifications)
 
     # Design System Architecture
-    arch_design_agent = ArchitectureDesignAgent(llm_reasoner, github_manager)
-    architecture_design = arch_design_agent.design_architecture(os.path.join(outputs_dir, 'system_specifications.txt'))
-    #print("System Architecture Design:", architecture_design)
-    save_output(os.path.join(outputs_dir, 'system_architecture.txt'), architecture_design)
+    def run_architecture():
+        arch_design_agent = ArchitectureDesignAgent(llm_reasoner, github_manager)
+        architecture_design = arch_design_agent.design_architecture(specifications_path)
+        #print("System Architecture Design:", architecture_design)
+        save_output(architecture_path, architecture_design)
 
     # Generate Codebase
-    code_gen_agent = CodeGenerationAgent(llm_reasoner, github_manager)
-    architecture_path = os.path.join(outputs_dir, 'system_architecture.txt')
-    specifications_path = os.path.join(outputs_dir, 'system_specifications.txt')
-    codebase = code_gen_agent.generate_codebase(architecture_path, specifications_path, outputs_dir, inputs_dir)
-    #print("Generated Codebase:", codebase)
-    save_output(os.path.join(outputs_dir, 'generated_codebase.txt'), codebase)
+    def run_codegen():
+        code_gen_agent = CodeGenerationAgent(llm_reasoner, github_manager)
+        # The agent writes generated_codebase.txt (raw JSON) and generated_codebase.zip itself
+        code_gen_agent.generate_codebase(architecture_path, specifications_path, outputs_dir, inputs_dir)
+
+    # Validate Codebase: compile, check imports and run generated tests; the errors are
+    # written as feedback text that can be used as inputs/feedback.txt
+    def run_validate():
+        run_validation(codebase_zip_path, validation_report_path, validation_feedback_path)
+
+    return [
+        Stage('goals', [goals_path], [refined_goals_path], run_goals),
+        Stage('environment', [env_path], [refined_env_path], run_environment),
+        Stage('specifications', [refined_goals_path, refined_env_path], [specifications_path], run_specifications),
+        Stage('architecture', [specifications_path], [architecture_path], run_architecture),
+        Stage('codegen', [architecture_path, specifications_path], [codebase_path, codebase_zip_path], run_codegen),
+        Stage('validate', [codebase_zip_path], [validation_report_path, validation_feedback_path], run_validate),
+    ]
+
+def run_project(base_dir, llm_reasoner, github_manager, force=False, resume=False, stages=None, projects_dir=None):
+    inputs_dir = os.path.join(base_dir, 'inputs')
+    outputs_dir = os.path.join(base_dir, OUTPUTS_DIR)
+
+    # Trace every LLM call of this run to <outputs>/traces/run_<timestamp>.jsonl
+    llm_reasoner = llm_reasoner.with_telemetry(Telemetry.for_project(outputs_dir))
+
+    # Agent Pipeline: stages whose inputs did not change since the last run are skipped
+    # Goals and environment of earlier projects next to this one (or in projects_dir) can be reused or used as a seed
+    similarity_cache = SimilarityCache(projects_dir or os.path.dirname(os.path.abspath(base_dir)))
+    pipeline = select_stages(build_pipeline(llm_reasoner, github_manager, inputs_dir, outputs_dir, similarity_cache),
+                             stages)
+    executor = PipelineExecutor(os.path.join(outputs_dir, '.pipeline_state.json'))
+    return executor.run(pipeline, force=force, resume=resume)
+
+# Pipeline per mode: run_project(base_dir, llm_reasoner, github_manager, force, resume, stages), its
+# stage names and the outputs directory inside the project
+PIPELINES = {
+    'multi': (run_project, STAGES, OUTPUTS_DIR),
+    'single': (single_agent.run_project, single_agent.STAGES, single_agent.OUTPUTS_DIR),
+    'feedback': (feedback.run_project, feedback.STAGES, feedback.OUTPUTS_DIR),
+}
+
+def resolve_project(project):
+    # A project directory, or the name of one under projects/
+    return project if os.path.isdir(os.path.join(project, 'inputs')) else os.path.join('projects', project)
+
+def dry_run(base_dir, mode, **options):
+    # Runs the pipeline on a throwaway copy of the project without calling a model or GitHub and
+    # prints the prompt sizes and estimated cost per stage. Answers come from the recorded outputs
+    # (DryRunBackend), calls the response cache would answer cost nothing, and up-to-date stages are
+    # skipped exactly like in the real run.
+    from FakeGitHub import FakeGithub
+    from LLMBackends import DryRunBackend, OpenAIBackend, create_backend
+    from ResponseCache import ResponseCache
+    from telemetry_report import aggregate
+
+    run, _, outputs_name = PIPELINES[mode]
+    project = os.path.basename(os.path.normpath(base_dir))
+    try:
+        target = create_backend()
+    except ValueError:
+        # Planning needs no API key: the payloads, and so the cache keys, are the same without one
+        target = OpenAIBackend(api_key='dry-run')
+    projects_dir = os.path.dirname(os.path.abspath(base_dir))
+    backend = DryRunBackend(target, projects_dir, project=project)
+    if mode == 'multi':
+        # The copy has no neighbouring projects; reuse decisions have to see the real ones
+        options = dict(options, projects_dir=projects_dir)
+    cache_mode = 'read' if os.getenv('LLM_CACHE', 'on').lower() == 'on' else 'off'
+    llm_reasoner = LLMReasoner(backend=backend, cache=ResponseCache(mode=cache_mode), rate_limiter=False)
+
+    with tempfile.TemporaryDirectory(prefix='dry_run_') as workspace:
+        copy_dir = os.path.join(workspace, project)
+        shutil.copytree(base_dir, copy_dir, ignore=shutil.ignore_patterns('traces', '__pycache__'))
+        github_manager = GitHubManager('dry-run', 'LLM_Software_Company', github=FakeGithub(login='dry-run'),
+                                       sha_cache_path=os.path.join(workspace, 'sha_cache.json'))
+        output = io.StringIO()
+        error = None
+        try:
+            with contextlib.redirect_stdout(output):
+                results = run(copy_dir, llm_reasoner, github_manager, **options)
+        except Exception as e:
+            results = {}
+            error = f"{type(e).__name__}: {e}"
+        records = []
+        for trace_path in glob.glob(os.path.join(copy_dir, outputs_name, 'traces', '*.jsonl')):
+            with open(trace_path, 'r', encoding='utf-8') as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+
+    print(f"Dry run of {project} ({mode}):")
+    for name in PIPELINES[mode][1]:
+        if name in results:
+            print(f"  {name}: {'would run' if results[name] == 'ran' else 'up to date, skipped'}")
+    if 'repair' in results:
+        print(f"  repair: codebase {results['repair']} after the repair rounds")
+    by_stage = aggregate(records, "stage")
+    if by_stage:
+        by_stage['Total'] = {key: sum(group[key] for group in by_stage.values())
+                             for key in ('calls', 'cache_hits', 'prompt_tokens', 'completion_tokens', 'cost')}
+        print(f"\n{'LLM calls':40} {'calls':>6} {'hits':>5} {'prompt tok':>11} {'compl tok':>10} {'cost $':>8}")
+        for name, group in by_stage.items():
+            print(f"{name[:40]:40} {group['calls']:6} {group['cache_hits']:5} {group['prompt_tokens']:11} "
+                  f"{group['completion_tokens']:10} {group['cost']:8.3f}")
+    models = sorted({record['model'] for record in records if record.get('cost') is None and not record.get('cache_hit')})
+    print(f"\nCompletion sizes are estimated from the recorded outputs; no prompt cache discount is assumed."
+          + (f" No prices for: {', '.join(models)}." if models else ""))
+    if error:
+        print(f"The dry run stopped early, the estimate is incomplete: {error}")
+    return records
+
+def parse_args(mode=None, argv=None, project=None):
+    project = project or DEFAULT_PROJECT
+    parser = argparse.ArgumentParser(description="Run the agent pipeline of a project.")
+    parser.add_argument('project', nargs='?', default=project,
+                        help=f"Project directory or name under projects/ (default: {project})")
+    parser.add_argument('--mode', choices=sorted(PIPELINES), default=mode or 'multi',
+                        help="multi: agent pipeline, single: one code generation agent, "
+                             "feedback: rework the codebase with inputs/feedback.txt")
+    parser.add_argument('--stages', help="Comma separated stages to run (default: all stages of the mode)")
+    parser.add_argument('--feedback-iterations', type=int, default=0,
+                        help="Feedback mode: validate-and-repair rounds after the feedback run")
+    parser.add_argument('--auto-repair', action='store_true',
+                        help="Feedback mode: repair rounds up to REPAIR_MAX_ITERATIONS")
+    parser.add_argument('--force', action='store_true', help="Re-run stages that are up to date")
+    # --resume continues an interrupted run at its first incomplete stage (see PipelineExecutor)
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted run")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print prompt sizes and estimated token cost without calling a model or GitHub")
+    args = parser.parse_args(argv)
+
+    args.base_dir = resolve_project(args.project)
+    if not os.path.isdir(os.path.join(args.base_dir, 'inputs')):
+        parser.error(f"No inputs directory in {args.base_dir}")
+    if args.stages is not None:
+        args.stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+        available = PIPELINES[args.mode][1]
+        unknown = [name for name in args.stages if name not in available]
+        if unknown:
+            parser.error(f"Unknown stages for --mode {args.mode}: {', '.join(unknown)} "
+                         f"(available: {', '.join(available)})")
+    if (args.feedback_iterations or args.auto_repair) and args.mode != 'feedback':
+        parser.error("--feedback-iterations and --auto-repair need --mode feedback")
+    return args
+
+def main(mode=None, argv=None, project=None):
+    # python main.py [project] --mode multi|single|feedback --stages a,b --feedback-iterations N --dry-run
+    args = parse_args(mode, argv, project)
+    options = {'force': args.force, 'resume': args.resume, 'stages': args.stages}
+    if args.mode == 'feedback' and (args.feedback_iterations > 0 or args.auto_repair):
+        options.update(auto_repair=True, repair_iterations=args.feedback_iterations or None)
+
+    if args.dry_run:
+        dry_run(args.base_dir, args.mode, **options)
+        return
+
+    # Initialize components
+    llm_reasoner = LLMReasoner()
+    # Initialize GitHub manager with a personal access token and repository name
+    # These are from the newly created GitHub repository that will be used to store the generated code
+    github_manager = GitHubManager(os.getenv('GITHUB_TOKEN'), 'LLM_Software_Company')
+
+    run = PIPELINES[args.mode][0]
+    run(args.base_dir, llm_reasoner, github_manager, **options)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
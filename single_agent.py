@@ -1,33 +1,52 @@
-from LLMReasoner import LLMReasoner
-from GitHubManager import GitHubManager
+from CodebaseValidator import run_validation
+from PipelineExecutor import PipelineExecutor, Stage, select_stages
+from Telemetry import Telemetry
 import os
 
 from agents.code_gen_agent import CodeGenerationAgent
 
-def save_output(filepath, content):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        if isinstance(content, (dict, list)):
-            import json
-            json.dump(content, f, ensure_ascii=False, indent=2)
-        else:
-            f.write(str(content))
-
-def main():
-    project_name = 'python_notes_App_5_Features_openAi_o3_mini'
-    base_dir = os.path.join('projects', project_name)
-    inputs_dir = os.path.join(base_dir, 'inputs')
-    outputs_dir = os.path.join(base_dir, 'outputs_single')
-
-    llm_reasoner = LLMReasoner()
-    github_manager = GitHubManager(os.getenv('GITHUB_TOKEN'), 'LLM_Software_Company')
+OUTPUTS_DIR = 'outputs_single'
+STAGES = ['single_codegen', 'validate']
 
+def build_pipeline(llm_reasoner, github_manager, inputs_dir, outputs_dir):
     code_gen_agent = CodeGenerationAgent(llm_reasoner, github_manager)
     goals_path = os.path.join(inputs_dir, 'goals.txt')
     environment_path = os.path.join(inputs_dir, 'environment.txt')
 
-    codebase = code_gen_agent.generate_codebase(goals_path, environment_path, outputs_dir, inputs_dir)
-    save_output(os.path.join(outputs_dir, 'generated_codebase.txt'), codebase)
+    # The agent writes generated_codebase.txt (raw JSON) and generated_codebase.zip itself
+    def run_single():
+        code_gen_agent.generate_codebase(goals_path, environment_path, outputs_dir, inputs_dir)
+
+    codebase_zip_path = os.path.join(outputs_dir, 'generated_codebase.zip')
+    validation_report_path = os.path.join(outputs_dir, 'validation_report.json')
+    validation_feedback_path = os.path.join(outputs_dir, 'validation_feedback.txt')
+
+    def run_validate():
+        run_validation(codebase_zip_path, validation_report_path, validation_feedback_path)
+
+    return [
+        Stage('single_codegen', [goals_path, environment_path],
+              [os.path.join(outputs_dir, 'generated_codebase.txt'), codebase_zip_path],
+              run_single),
+        Stage('validate', [codebase_zip_path], [validation_report_path, validation_feedback_path], run_validate),
+    ]
+
+def run_project(base_dir, llm_reasoner, github_manager, force=False, resume=False, stages=None):
+    inputs_dir = os.path.join(base_dir, 'inputs')
+    outputs_dir = os.path.join(base_dir, OUTPUTS_DIR)
+    os.makedirs(outputs_dir, exist_ok=True)
+
+    # Trace every LLM call of this run to <outputs>/traces/run_<timestamp>.jsonl
+    llm_reasoner = llm_reasoner.with_telemetry(Telemetry.for_project(outputs_dir))
+
+    pipeline = select_stages(build_pipeline(llm_reasoner, github_manager, inputs_dir, outputs_dir), stages)
+    executor = PipelineExecutor(os.path.join(outputs_dir, '.pipeline_state.json'))
+    return executor.run(pipeline, force=force, resume=resume)
+
+def main():
+    # Kept for existing scripts: same as python main.py --mode single, with notes_App_5 as the default project
+    import main as cli
+    cli.main(mode='single', project='python_notes_App_5_Features_openAi_o3_mini')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import argparse
+import glob
+import json
+import os
+from collections import defaultdict
+
+
+def load_traces(pattern):
+    records = []
+    for trace_path in sorted(glob.glob(pattern)):
+        # projects/<name>/<outputs dir>/traces/run_<id>.jsonl
+        outputs_dir = os.path.dirname(os.path.dirname(trace_path))
+        project = os.path.basename(os.path.dirname(outputs_dir))
+        mode = os.path.basename(outputs_dir)
+        with open(trace_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                record["project"] = project
+                record["mode"] = mode
+                record["run"] = os.path.basename(trace_path)
+                records.append(record)
+    return records
+
+
+def aggregate(records, key):
+    groups = defaultdict(lambda: {
+        "calls": 0, "cache_hits": 0, "errors": 0, "retries": 0,
+        "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "latency": 0.0, "max_latency": 0.0, "cost": 0.0
+    })
+    for record in records:
+        group = groups[record[key]]
+        group["calls"] += 1
+        group["cache_hits"] += bool(record.get("cache_hit"))
+        group["errors"] += "error" in record
+        group["retries"] += record.get("retries", 0)
+        group["prompt_tokens"] += record.get("prompt_tokens", 0)
+        group["cached_tokens"] += record.get("cached_tokens", 0)
+        group["completion_tokens"] += record.get("completion_tokens", 0)
+        group["latency"] += record.get("latency", 0.0)
+        group["max_latency"] = max(group["max_latency"], record.get("latency", 0.0))
+        group["cost"] += record.get("cost") or 0.0
+    return dict(groups)
+
+
+def print_table(title, groups):
+    total_latency = sum(group["latency"] for group in groups.values()) or 1.0
+    print(f"\n{title}")
+    print(f"{'':40} {'calls':>6} {'hits':>5} {'retry':>5} {'prompt tok':>11} {'cached':>7} {'compl tok':>10} "
+          f"{'time s':>9} {'share':>6} {'max s':>8} {'cost $':>8}")
+    for name, group in sorted(groups.items(), key=lambda item: -item[1]["latency"]):
+        # Share of the prompt tokens the provider served from its prompt cache
+        cached_rate = group["cached_tokens"] / group["prompt_tokens"] if group["prompt_tokens"] else 0.0
+        print(f"{name[:40]:40} {group['calls']:6} {group['cache_hits']:5} {group['retries']:5} "
+              f"{group['prompt_tokens']:11} {cached_rate:7.1%} {group['completion_tokens']:10} "
+              f"{group['latency']:9.1f} {group['latency'] / total_latency:6.1%} {group['max_latency']:8.1f} "
+              f"{group['cost']:8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate LLM call traces across projects.")
+    parser.add_argument('--traces', default=os.path.join('projects', '*', '*', 'traces', '*.jsonl'),
+                        help="Glob of trace files")
+    parser.add_argument('--json', dest='json_path', help="Also write the aggregates to this JSON file")
+    args = parser.parse_args()
+
+    records = load_traces(args.traces)
+    if not records:
+        print("No traces found.")
+        return
+
+    by_stage = aggregate(records, "stage")
+    by_project = aggregate(records, "project")
+    print_table("Per stage", by_stage)
+    print_table("Per project", by_project)
+    prompt_tokens = sum(record.get("prompt_tokens", 0) for record in records)
+    cached_tokens = sum(record.get("cached_tokens", 0) for record in records)
+    print(f"\nPrompt cache: {cached_tokens} of {prompt_tokens} prompt tokens cached "
+          f"({cached_tokens / prompt_tokens if prompt_tokens else 0.0:.1%})")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({"stages": by_stage, "projects": by_project}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()